@@ -2,6 +2,13 @@
 import { NextResponse } from "next/server";
 import { supabase } from "@/lib/supabaseClient";
 
+// части курсора подставляются в PostgREST-фильтр .or() — пропускаем
+// только то, что реально отдаём в nextCursor: created_at и uuid заявки
+const CURSOR_AT_RE =
+  /^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,9})?(Z|[+-]\d{2}(:?\d{2})?)$/;
+const CURSOR_ID_RE =
+  /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+
 export async function POST(req: Request) {
   try {
     const body = await req.json().catch(() => ({} as any));
@@ -13,8 +20,30 @@ export async function POST(req: Request) {
       limit = n;
     }
 
+    // keyset-курсор "<created_at>|<id>" последней заявки предыдущей страницы
+    const cursorRaw = typeof body?.cursor === "string" ? body.cursor : null;
+    const sep = cursorRaw ? cursorRaw.lastIndexOf("|") : -1;
+    const cursorAt = sep > 0 ? cursorRaw!.slice(0, sep) : null;
+    const cursorId = sep > 0 ? cursorRaw!.slice(sep + 1) : null;
+
+    if (
+      cursorRaw &&
+      !(
+        cursorAt &&
+        cursorId &&
+        CURSOR_AT_RE.test(cursorAt) &&
+        !Number.isNaN(Date.parse(cursorAt)) &&
+        CURSOR_ID_RE.test(cursorId)
+      )
+    ) {
+      return NextResponse.json(
+        { error: "INVALID_CURSOR", message: "cursor must be <ISO timestamp>|<uuid>" },
+        { status: 400 }
+      );
+    }
+
     // 1) Берём ТОЛЬКО pending-заявки
-    const { data, error } = await supabase
+    let query = supabase
       .from("xp_task_completions")
       .select(
         `
@@ -36,7 +65,17 @@ export async function POST(req: Request) {
       )
       .eq("status", "pending")                    // 👈 фильтр по pending
       .order("created_at", { ascending: false })  // новые сверху
-      .limit(limit);
+      .order("id", { ascending: false })
+      // +1 запись — чтобы понять, есть ли следующая страница
+      .limit(limit + 1);
+
+    if (cursorAt && cursorId) {
+      query = query.or(
+        `created_at.lt."${cursorAt}",and(created_at.eq."${cursorAt}",id.lt."${cursorId}")`
+      );
+    }
+
+    const { data, error } = await query;
 
     if (error) {
       console.error("[Supabase] xp_task_completions pending error:", error);
@@ -50,11 +89,17 @@ export async function POST(req: Request) {
       return NextResponse.json({
         ok: true,
         items: [],
+        nextCursor: null,
       });
     }
 
     // 2) Мапим в удобный формат
-    const items = data.map((c: any) => {
+    const hasMore = data.length > limit;
+    const page = hasMore ? data.slice(0, limit) : data;
+    const last: any = page[page.length - 1];
+    const nextCursor = hasMore ? `${last.created_at}|${last.id}` : null;
+
+    const items = page.map((c: any) => {
       const t = c.task || null;
 
       return {
@@ -77,6 +122,7 @@ export async function POST(req: Request) {
     return NextResponse.json({
       ok: true,
       items,
+      nextCursor,
     });
   } catch (e: any) {
     console.error("[XP] /api/xp/tasks/pending error:", e);
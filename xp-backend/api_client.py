@@ -0,0 +1,273 @@
+"""
+HTTP-клиент бота к Next.js API (/api/xp/*).
+
+Одна долгоживущая aiohttp-сессия на весь процесс бота: keep-alive,
+ограниченный пул соединений, кэш DNS и таймаут на каждый запрос.
+Счётчики создания/переиспользования соединений показывают,
+что TLS-рукопожатия на каждую команду больше не происходят.
+
+Поверх сессии — защита от проблем бэкенда:
+- свои таймауты для разных эндпоинтов;
+- ретраи с экспоненциальной задержкой и jitter, только для идемпотентных
+  путей (чтение списков), чтобы не создать задачу или заявку дважды;
+- circuit breaker: пока API лежит, запросы сразу падают с CircuitOpenError;
+- опциональный hedging для чтений: если ответа нет за hedge_delay,
+  уходит второй такой же запрос и берётся тот, что ответит первым.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Callable
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """API помечен как нездоровый, запрос не отправлялся."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            # время вышло — пропускаем один пробный запрос
+            self.state = "half_open"
+            self._probe_in_flight = False
+
+        # пробный запрос мог быть отменён и не отчитаться — не ждём его вечно
+        now = time.monotonic()
+        if self._probe_in_flight and now - self._probe_started_at < self.reset_timeout:
+            self.rejected += 1
+            return False
+        self._probe_in_flight = True
+        self._probe_started_at = now
+        return True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class ApiClient:
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        pool_limit: int = 20,
+        pool_limit_per_host: int = 10,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        timeout: float = 10.0,
+        endpoint_timeouts: dict[str, float] | None = None,
+        idempotent_paths: set[str] | None = None,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_cap: float = 2.0,
+        hedge_delay: float | None = None,
+        breaker: CircuitBreaker | None = None,
+        on_request: Callable[[str, str, float], None] | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+
+        self.endpoint_timeouts = endpoint_timeouts or {}
+        self.idempotent_paths = idempotent_paths or set()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        # on_request(path, status, seconds) — для метрик; status="error" при исключении
+        self._on_request = on_request
+
+        self._session: aiohttp.ClientSession | None = None
+
+        # сколько раз открывали новое соединение / брали готовое из пула
+        self.connections_created = 0
+        self.connections_reused = 0
+
+        self.retries = 0
+        self.hedged_requests = 0
+
+    # -----------------------------------------------------------------
+    # Сессия
+    # -----------------------------------------------------------------
+    def _make_trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_create(session, ctx, params):
+            self.connections_created += 1
+
+        async def on_reuse(session, ctx, params):
+            self.connections_reused += 1
+
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # создаём лениво: сессия должна жить внутри работающего event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._make_trace_config()],
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # -----------------------------------------------------------------
+    # Запросы
+    # -----------------------------------------------------------------
+    async def _request_once(self, path: str, payload: dict, timeout: float):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            status, data = await self._send(path, payload, timeout)
+            return status, data
+        finally:
+            if self._on_request is not None:
+                self._on_request(path, str(status), time.perf_counter() - started)
+
+    async def _send(self, path: str, payload: dict, timeout: float):
+        url = f"{self.base_url}/{path}"
+        session = self._get_session()
+
+        async with session.post(
+            url,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as resp:
+            try:
+                data = await resp.json()
+            except Exception:
+                text = await resp.text()
+                log.warning(
+                    "API bad response",
+                    extra={"path": path, "status": resp.status, "raw": text[:500]},
+                )
+                return resp.status, {"error": "INVALID_RESPONSE", "raw": text}
+
+            if resp.status >= 400:
+                log.warning(
+                    "API error status",
+                    extra={"path": path, "status": resp.status, "body": data},
+                )
+            return resp.status, data
+
+    async def _request_hedged(self, path: str, payload: dict, timeout: float):
+        pending = {asyncio.create_task(self._request_once(path, payload, timeout))}
+        hedged = False
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else self.hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+
+                # первый запрос молчит дольше hedge_delay — дублируем его
+                if not done and not hedged:
+                    hedged = True
+                    self.hedged_requests += 1
+                    pending.add(
+                        asyncio.create_task(self._request_once(path, payload, timeout))
+                    )
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": равномерно от 0 до экспоненциального потолка
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    async def post(self, path: str, payload: dict, *, timeout: float | None = None):
+        if not self.breaker.allow():
+            raise CircuitOpenError(path)
+
+        timeout = timeout or self.endpoint_timeouts.get(path, self.timeout)
+        idempotent = path in self.idempotent_paths
+        attempts = 1 + (self.max_retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            try:
+                if idempotent and self.hedge_delay:
+                    status, data = await self._request_hedged(path, payload, timeout)
+                else:
+                    status, data = await self._request_once(path, payload, timeout)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+            else:
+                if status < 500:
+                    self.breaker.record_success()
+                    return data
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    return data
+
+            await asyncio.sleep(self._backoff(attempt))
+            if not self.breaker.allow():
+                raise CircuitOpenError(path)
+            self.retries += 1
+
+    def stats(self) -> dict:
+        total = self.connections_created + self.connections_reused
+        return {
+            "connectionsCreated": self.connections_created,
+            "connectionsReused": self.connections_reused,
+            "reuseRatio": (self.connections_reused / total) if total else 0.0,
+            "retries": self.retries,
+            "hedgedRequests": self.hedged_requests,
+            "circuitState": self.breaker.state,
+            "circuitRejected": self.breaker.rejected,
+        }
@@ -0,0 +1,52 @@
+"""
+Бенчмарк лидерборда на 1M пользователей.
+
+Запуск из xp-backend/:
+    python bench/bench_leaderboard.py [--users 1000000] [--ops 100000] [--save-baseline | --compare]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import Leaderboard  # noqa: E402
+from report import add_baseline_args, finish, time_each  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    user_ids = [str(i) for i in range(args.users)]
+    balances = [(uid, rnd.randint(0, 1_000_000)) for uid in user_ids]
+
+    start = time.perf_counter()
+    board = Leaderboard(balances)
+    print(f"load: {time.perf_counter() - start:.2f} s ({args.users} users)\n")
+
+    totals = dict(balances)
+
+    def claim():
+        uid = rnd.choice(user_ids)
+        totals[uid] += rnd.randint(1, 500)
+        board.update(uid, totals[uid])
+
+    results = {
+        "update (claim)": time_each(claim, args.ops),
+        "rank": time_each(lambda: board.rank(rnd.choice(user_ids)), args.ops),
+        "around (radius 5)": time_each(lambda: board.around(rnd.choice(user_ids), 5), args.ops),
+        "top 10": time_each(lambda: board.top(10), args.ops),
+    }
+    return finish("leaderboard", results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Общая база воркеров (shared_state.py) под нагрузкой нескольких процессов.
+
+Каждый процесс повторяет то, что /xp/claim делает с общей базой при
+XP_SHARED_STATE=1: бакет адреса клиента (RateLimitMiddleware), затем одной
+транзакцией бакет юзера, занятие ключа идемпотентности и счётчик
+выполнений, в конце — сохранение ответа. Замер идёт для одного процесса
+и для --workers процессов: пропускная способность должна расти с числом
+ядер, а не упираться в блокировку базы.
+
+Запуск из xp-backend/:
+    python bench/bench_shared_state.py [--workers 4] [--claims 5000] [--save-baseline | --compare]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from completion_policy import policy_for  # noqa: E402
+from shared_state import (  # noqa: E402
+    SharedCompletionPolicy,
+    SharedDedupIndex,
+    SharedRateLimiter,
+    SharedState,
+)
+from report import add_baseline_args, finish, summarize  # noqa: E402
+
+# лимиты, которые в замере никогда не срабатывают
+UNLIMITED = dict(user_rate=1e9, user_burst=1e9)
+
+
+def run_worker(path: str, worker: int, workers: int, claims: int, users: int, out) -> None:
+    state = SharedState(path)
+    http_limiter = SharedRateLimiter(
+        state, scope="ip", **UNLIMITED, global_rate=1e9, global_burst=1e9, workers=workers
+    )
+    claim_limiter = SharedRateLimiter(state, scope="tg", **UNLIMITED, global_rate=None)
+    dedup = SharedDedupIndex(state)
+    policy = SharedCompletionPolicy(state, default=policy_for("multi", 1_000_000))
+
+    latencies = []
+    for i in range(claims):
+        user_id = f"{worker}-{i % users}"
+        key = f"claim:{user_id}:{i}"
+        started = time.perf_counter()
+        http_limiter.check(f"10.0.{worker}.{i % 250}")
+        with state.transaction():
+            claim_limiter.check(user_id)
+            dedup.reserve(key)
+            policy.try_acquire(user_id, "bench")
+        dedup.put(key, {"ok": True})
+        latencies.append(time.perf_counter() - started)
+    state.close()
+    out.put(latencies)
+
+
+def bench(workers: int, args, tmp: str) -> dict:
+    path = os.path.join(tmp, f"shared-{workers}.db")
+    SharedState(path).close()
+
+    out = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(
+            target=run_worker, args=(path, w, workers, args.claims, args.users, out)
+        )
+        for w in range(workers)
+    ]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    latencies = [lat for _ in procs for lat in out.get()]
+    for proc in procs:
+        proc.join()
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--claims", type=int, default=5_000, help="claim'ов на процесс")
+    parser.add_argument("--users", type=int, default=500)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results: dict = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        results["claim, 1 worker"] = bench(1, args, tmp)
+        if args.workers > 1:
+            results[f"claim, {args.workers} workers"] = bench(args.workers, args, tmp)
+
+    return finish("shared_state", results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
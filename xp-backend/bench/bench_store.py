@@ -0,0 +1,70 @@
+"""
+Микробенчмарк хранилищ XP и журнала начислений.
+
+Запуск из xp-backend/:
+    python bench/bench_store.py [--users 10000] [--ops 20000] [--batch 100] [--save-baseline | --compare]
+
+SQLite и журнал пишутся во временный каталог, который удаляется в конце.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog  # noqa: E402
+from xp_store import MemoryXpStore, SqliteXpStore, XpStore  # noqa: E402
+from completion_policy import CompletionPolicy, policy_for  # noqa: E402
+from report import add_baseline_args, finish, time_each  # noqa: E402
+
+
+def bench_store(label: str, store: XpStore, args, rnd: random.Random, results: dict) -> None:
+    user_ids = [str(i) for i in range(args.users)]
+
+    results[f"{label} increment"] = time_each(
+        lambda: store.increment(rnd.choice(user_ids), 100), args.ops
+    )
+    results[f"{label} get"] = time_each(lambda: store.get(rnd.choice(user_ids)), args.ops)
+    # так пишет write-behind: одна транзакция на пачку пользователей
+    results[f"{label} increment_many({args.batch})"] = time_each(
+        lambda: store.increment_many({uid: 100 for uid in rnd.sample(user_ids, args.batch)}),
+        max(1, args.ops // args.batch),
+    )
+    store.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    results: dict = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_store("memory", MemoryXpStore(), args, rnd, results)
+        bench_store("sqlite", SqliteXpStore(os.path.join(tmp, "xp.db")), args, rnd, results)
+
+        log = EventLog(os.path.join(tmp, "events"))
+        log.open()
+        results["event_log append"] = time_each(
+            lambda: log.append(str(rnd.randrange(args.users)), "bench", 100), args.ops
+        )
+        log.close()
+
+    policy = CompletionPolicy(default=policy_for("daily", 3))
+    results["policy try_acquire"] = time_each(
+        lambda: policy.try_acquire(str(rnd.randrange(args.users)), "bench"), args.ops
+    )
+
+    return finish("store", results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Микробенчмарк проверки initData на один claim.
+
+Запуск из xp-backend/:
+    python bench/bench_verify.py [--n 20000] [--save-baseline | --compare]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram_auth import InitDataVerifier, sign_init_data  # noqa: E402
+from report import add_baseline_args, finish, time_each  # noqa: E402
+
+BOT_TOKEN = "123456:BENCH-TOKEN"
+
+
+def make_init_data(user_id: int) -> str:
+    return sign_init_data(
+        {
+            "query_id": f"AAH{user_id}",
+            "user": json.dumps({"id": user_id, "first_name": "Bench"}),
+            "auth_date": str(int(time.time())),
+        },
+        BOT_TOKEN,
+    )
+
+
+def run(verifier: InitDataVerifier, samples: list[str]) -> dict:
+    it = iter(samples)
+
+    def verify_next():
+        if verifier.verify(next(it)) is None:
+            raise RuntimeError("verification failed")
+
+    return time_each(verify_next, len(samples))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20_000)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    unique = [make_init_data(i) for i in range(args.n)]
+    hot = [unique[i % 100] for i in range(args.n)]
+
+    results = {
+        # каждый initData новый — всегда полный парсинг + HMAC
+        "cold (unique initData)": run(InitDataVerifier(BOT_TOKEN), unique),
+        # 100 горячих клиентов — почти всё берётся из LRU
+        "hot (100 clients, LRU)": run(InitDataVerifier(BOT_TOKEN), hot),
+        # LRU отключён, чтобы увидеть чистую цену проверки
+        "hot (LRU size 0)": run(InitDataVerifier(BOT_TOKEN, cache_size=0), hot),
+    }
+    return finish("verify", results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
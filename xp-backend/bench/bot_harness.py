@@ -0,0 +1,219 @@
+"""
+Стенд для хендлеров бота без Telegram и без прод-API.
+
+Поднимает локальную заглушку, которая отвечает и за Bot API
+(/bot<token>/sendMessage и т.п.), и за Next.js /api/xp/*. Затем
+прогоняет синтетические апдейты через dp.feed_update — через те же
+middleware (rate limit, пул воркеров, метрики), что и в проде.
+Задержка апдейта = от постановки в пул воркеров до конца хендлера.
+
+Запуск из xp-backend/:
+    python bench/bot_harness.py --scenario mix --updates 5000 --users 500 --api-delay-ms 20
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BOT_TOKEN = "123456:BENCH-TOKEN"
+
+# до импорта bot: свой токен, без лимитов на апдейты и отправку, без шумных логов
+os.environ["TELEGRAM_BOT_TOKEN"] = BOT_TOKEN
+os.environ["BOT_MODE"] = "polling"
+for _name in ("BOT_RATE_PER_USER", "BOT_BURST_PER_USER", "BOT_RATE_GLOBAL", "BOT_BURST_GLOBAL"):
+    os.environ[_name] = "1000000"
+# лимиты Telegram на исходящие меряет не этот стенд (см. send_queue.py)
+for _name in ("TG_GLOBAL_RATE", "TG_GLOBAL_BURST", "TG_PER_CHAT_BURST"):
+    os.environ.setdefault(_name, "1000000")
+os.environ.setdefault("TG_PER_CHAT_INTERVAL", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from aiohttp import web  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import bot as bot_app  # noqa: E402
+from report import add_baseline_args, finish, summarize  # noqa: E402
+
+SCENARIOS = {
+    "tasks": ["/tasks"],
+    "done": ["/done TASK_{n}"],
+    "pending": ["/pending"],
+    "mix": ["/tasks", "/tasks", "/done TASK_{n}", "/pending"],
+}
+
+
+# ---------------------------------------------------------------------
+# Заглушка Bot API + Next.js API
+# ---------------------------------------------------------------------
+def build_stub(args, calls: dict) -> web.Application:
+    message_ids = itertools.count(1)
+    tasks = [
+        {"code": f"TASK_{i}", "title": f"Задача {i}", "rewardXp": 100}
+        for i in range(args.tasks)
+    ]
+    pending = [
+        {
+            "id": f"c-{i}",
+            "taskCode": f"TASK_{i % args.tasks}",
+            "taskTitle": f"Задача {i % args.tasks}",
+            "telegramUserId": 1_000_000 + i,
+            "rewardXp": 100,
+        }
+        for i in range(args.pending)
+    ]
+
+    async def delay():
+        if args.api_delay_ms:
+            await asyncio.sleep(args.api_delay_ms / 1000)
+
+    async def telegram(request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        calls[method] = calls.get(method, 0) + 1
+        form = await request.post()
+        if method == "answerCallbackQuery":
+            return web.json_response({"ok": True, "result": True})
+        chat_id = int(form.get("chat_id") or 0)
+        return web.json_response({
+            "ok": True,
+            "result": {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": form.get("text") or "",
+            },
+        })
+
+    async def next_api(request: web.Request) -> web.Response:
+        path = request.match_info["path"]
+        calls[path] = calls.get(path, 0) + 1
+        body = await request.json()
+        await delay()
+
+        if path == "tasks/list":
+            return web.json_response({"ok": True, "tasks": tasks})
+        if path == "tasks/pending":
+            start = int(body.get("cursor") or 0)
+            limit = int(body.get("limit") or 50)
+            end = start + limit
+            return web.json_response({
+                "ok": True,
+                "items": pending[start:end],
+                "nextCursor": str(end) if end < len(pending) else None,
+            })
+        if path == "tasks/submit":
+            return web.json_response({"ok": True, "status": "pending"})
+        if path in ("tasks/approve", "tasks/reject"):
+            return web.json_response({
+                "ok": True,
+                "rewardXp": 100,
+                "profile": {"stats": {"level": 2, "totalXp": 600}},
+            })
+        return web.json_response({"error": "NOT_FOUND"}, status=404)
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", telegram)
+    app.router.add_post("/api/xp/{path:.+}", next_api)
+    return app
+
+
+def fake_message_update(update_id: int, text: str, user_id: int) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Harness"},
+                "text": text,
+                "entities": [
+                    {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+                ],
+            },
+        },
+        context={"bot": bot_app.bot},
+    )
+
+
+# ---------------------------------------------------------------------
+# Прогон
+# ---------------------------------------------------------------------
+async def run(args) -> dict:
+    calls: dict[str, int] = {}
+    runner = web.AppRunner(build_stub(args, calls))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    stub_url = f"http://127.0.0.1:{args.port}"
+
+    # все исходящие запросы бота — в заглушку
+    bot_app.bot.session.api = TelegramAPIServer.from_base(stub_url)
+    bot_app.api.base_url = f"{stub_url}/api/xp"
+
+    pool = bot_app.update_pool
+    latencies: list[float] = []
+    submit = pool.submit
+
+    async def timed_submit(key, job):
+        enqueued_at = time.perf_counter()
+
+        async def timed_job():
+            try:
+                return await job()
+            finally:
+                latencies.append(time.perf_counter() - enqueued_at)
+
+        return await submit(key, timed_job)
+
+    pool.submit = timed_submit
+    pool.start()
+
+    rnd = random.Random(args.seed)
+    templates = SCENARIOS[args.scenario]
+    admins = sorted(bot_app.ADMINS)
+    users = [2_000_000 + i for i in range(args.users)]
+
+    started = time.perf_counter()
+    for update_id in range(1, args.updates + 1):
+        text = rnd.choice(templates).format(n=rnd.randrange(args.tasks))
+        # админские команды — от админа, остальное — от обычных пользователей
+        user_id = rnd.choice(admins) if text.startswith("/pending") else rnd.choice(users)
+        await bot_app.dp.feed_update(bot_app.bot, fake_message_update(update_id, text, user_id))
+    # stop() дожидается, пока воркеры разберут очереди
+    await pool.stop()
+    elapsed = time.perf_counter() - started
+
+    print(f"pool: {pool.stats()}")
+    print(f"stub calls: {calls}\n")
+
+    await bot_app.api.close()
+    await bot_app.bot.session.close()
+    await runner.cleanup()
+    return {f"{args.scenario} update": summarize(latencies, elapsed)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mix")
+    parser.add_argument("--updates", type=int, default=2_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--pending", type=int, default=60)
+    parser.add_argument("--api-delay-ms", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    return finish(f"bot_{args.scenario}", results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Нагрузочный генератор для POST /xp/claim.
+
+initData подписывается локально тем же токеном, что у сервиса,
+поэтому запросы проходят полную проверку подписи.
+
+1) запусти сервис (токен любой, но одинаковый с генератором):
+    TELEGRAM_BOT_TOKEN=123456:BENCH-TOKEN XP_RATE_GLOBAL=1000000 \\
+    XP_RATE_PER_CLIENT=1000000 XP_BURST_PER_CLIENT=1000000 uvicorn main:app
+2) из xp-backend/:
+    python bench/load_claims.py --requests 20000 --concurrency 64 --users 5000
+
+Каждый запрос — отдельный idempotencyKey, чтобы не попадать в replay-кэш.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram_auth import sign_init_data  # noqa: E402
+from report import add_baseline_args, finish, summarize  # noqa: E402
+
+
+def make_init_data(user_id: int, bot_token: str) -> str:
+    return sign_init_data(
+        {
+            "query_id": f"AAH{user_id}",
+            "user": json.dumps({"id": user_id, "first_name": "Load"}),
+            "auth_date": str(int(time.time())),
+        },
+        bot_token,
+    )
+
+
+async def run(args) -> dict:
+    rnd = random.Random(args.seed)
+    # один initData на пользователя — как у настоящего клиента мини-апки
+    init_data = {
+        uid: make_init_data(uid, args.bot_token)
+        for uid in range(1_000_000, 1_000_000 + args.users)
+    }
+    user_ids = list(init_data)
+    url = f"{args.url.rstrip('/')}/xp/claim"
+
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def worker(numbers, record: bool) -> None:
+            # общий итератор номеров делит запросы между корутинами
+            for i in numbers:
+                uid = rnd.choice(user_ids)
+                payload = {
+                    "userId": str(uid),
+                    "initData": init_data[uid],
+                    "taskId": f"task-{rnd.randrange(args.tasks)}",
+                    "amount": args.amount,
+                    "idempotencyKey": f"load-{args.seed}-{i}",
+                }
+                started = time.perf_counter()
+                async with session.post(url, json=payload) as resp:
+                    await resp.read()
+                    status = resp.status
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        # прогрев: соединения, LRU initData, страницы SQLite
+        warmup = iter(range(args.warmup))
+        await asyncio.gather(*(worker(warmup, False) for _ in range(args.concurrency)))
+
+        numbers = iter(range(args.warmup, args.warmup + args.requests))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(numbers, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"statuses: {statuses}\n")
+    return {"claim": summarize(latencies, elapsed)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--bot-token", default=os.getenv("TELEGRAM_BOT_TOKEN", "123456:BENCH-TOKEN"))
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--amount", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    return finish("claims", results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Общие функции для бенчмарков: перцентили, таблица результатов, базовые замеры.
+
+Результат бенчмарка — {имя замера: {"count", "p50Ms", "p99Ms", "opsPerSec"}}.
+finish() печатает таблицу и по флагам:
+    --save-baseline  — сохраняет результат в bench/baselines/<бенчмарк>.json
+    --compare        — сравнивает с сохранённым; при регрессии больше
+                       --tolerance (p99 выросла / пропускная способность упала)
+                       возвращает код 1 — удобно для CI
+Базовые замеры зависят от машины: сравнивать имеет смысл только на той же.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Callable
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    """
+    latencies и elapsed — в секундах.
+    """
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "opsPerSec": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def time_each(fn: Callable[[], object], ops: int) -> dict:
+    """
+    Замер по каждому вызову — для перцентилей, а не только среднего.
+    """
+    latencies = []
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    for _ in range(ops):
+        t0 = perf_counter()
+        fn()
+        latencies.append(perf_counter() - t0)
+    return summarize(latencies, perf_counter() - started)
+
+
+def add_baseline_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+
+
+def _baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def _regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for label, current in results.items():
+        before = baseline.get(label)
+        if not before:
+            continue
+        if before["p99Ms"] and current["p99Ms"] > before["p99Ms"] * (1 + tolerance):
+            found.append(f"{label}: p99 {before['p99Ms']} -> {current['p99Ms']} ms")
+        if before["opsPerSec"] and current["opsPerSec"] < before["opsPerSec"] * (1 - tolerance):
+            found.append(f"{label}: ops/s {before['opsPerSec']} -> {current['opsPerSec']}")
+    return found
+
+
+def finish(name: str, results: dict, args: argparse.Namespace) -> int:
+    print(f"{'':<28} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>12} {'n':>9}")
+    for label, r in results.items():
+        print(
+            f"{label:<28} {r['p50Ms']:>10.4f} {r['p99Ms']:>10.4f} "
+            f"{r['opsPerSec']:>12.1f} {r['count']:>9}"
+        )
+
+    code = 0
+    path = _baseline_path(name)
+    if args.compare:
+        if not os.path.exists(path):
+            print(f"\nнет базового замера {path} — запусти с --save-baseline")
+        else:
+            with open(path, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+            found = _regressions(results, baseline, args.tolerance)
+            for line in found:
+                print(f"REGRESSION {line}")
+            if not found:
+                print(f"\nрегрессий нет (допуск {args.tolerance:.0%})")
+            code = 1 if found else 0
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"savedAt": int(time.time()), "results": results}, f, indent=2)
+        print(f"\nбазовый замер сохранён: {path}")
+
+    return code
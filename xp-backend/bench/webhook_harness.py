@@ -0,0 +1,80 @@
+"""
+Локальный стенд для webhook-режима: шлёт фейковые апдейты на бота.
+
+1) запусти бота:
+    BOT_MODE=webhook WEBHOOK_BASE_URL=https://example.invalid \\
+    WEBHOOK_SECRET=local-secret python bot.py
+2) из xp-backend/:
+    python bench/webhook_harness.py --secret local-secret --text /tasks --count 200
+
+Бот ответит 200 сразу (апдейт обрабатывается в фоне), поэтому здесь
+измеряется задержка приёма апдейта, а не время работы хендлера.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+_update_ids = itertools.count(1)
+
+
+def fake_message_update(text: str, user_id: int) -> dict:
+    update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Harness"},
+            "text": text,
+            "entities": (
+                [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                if text.startswith("/")
+                else []
+            ),
+        },
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080/telegram/webhook")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--text", default="/tasks")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret}
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+
+        async def send_one(i: int) -> None:
+            update = fake_message_update(args.text, 1_000_000 + i % args.users)
+            async with sem:
+                started = time.perf_counter()
+                async with session.post(args.url, json=update) as resp:
+                    await resp.read()
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send_one(i) for i in range(args.count)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"statuses: {statuses}")
+    print(f"p50 {p50:.2f} ms  p99 {p99:.2f} ms  {args.count / elapsed:.0f} upd/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
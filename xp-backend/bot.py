@@ -1,29 +1,57 @@
 import asyncio
+import logging
 import os
-import aiohttp
+import signal
+import time
+from contextvars import ContextVar
 from datetime import datetime
 
-from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher, F, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import CommandStart, Command
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
+    InlineKeyboardMarkup,
+    InlineKeyboardButton,
     WebAppInfo,
     BotCommand,
 )
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from dotenv import load_dotenv
 
+from api_client import ApiClient, CircuitBreaker
+from task_cache import TaskCatalogueCache, TaskCatalogueError
+from fsm_storage import SqliteStorage
+from send_queue import PRIORITY_ADMIN, PRIORITY_BULK, PRIORITY_USER, SendScheduler
+from digest import DigestBatcher
+from paging import MESSAGE_LIMIT, PageLoadError, PendingPages, clip, split_pages
+from rate_limit import RateLimiter
+from update_pool import UpdateWorkerPool
+from metrics import CONTENT_TYPE, REGISTRY
+from log_setup import dropped_records, setup_logging, shutdown_logging
+
 # Подтягиваем .env (локально), но переменные Railway будут главнее
 load_dotenv()
 
+# JSON-логи через очередь и фоновый поток — не блокируют event loop
+setup_logging()
+log = logging.getLogger("bot")
+
 # ---------------------------------------------------------------------
 # Загрузка и валидация токена
 # ---------------------------------------------------------------------
 BOT_TOKEN_RAW = os.getenv("TELEGRAM_BOT_TOKEN")
 
-print("DEBUG TELEGRAM_BOT_TOKEN RAW:", repr(BOT_TOKEN_RAW))
+log.debug(
+    "TELEGRAM_BOT_TOKEN loaded",
+    extra={"tokenTail": (BOT_TOKEN_RAW or "")[-4:], "tokenLength": len(BOT_TOKEN_RAW or "")},
+)
 
 if not BOT_TOKEN_RAW:
     raise RuntimeError(
@@ -45,6 +73,93 @@ MINIAPP_URL = "https://lifeos-webapp.vercel.app"
 # URL Next.js API (тот же домен)
 API_BASE = f"{MINIAPP_URL}/api/xp"
 
+# Таймауты по эндпоинтам: чтения короткие, approve пересчитывает профиль
+API_ENDPOINT_TIMEOUTS = {
+    "tasks/list": 5.0,
+    "tasks/pending": 5.0,
+    "tasks/submit": 10.0,
+    "tasks/create": 10.0,
+    "tasks/approve": 15.0,
+    "tasks/reject": 10.0,
+    "tasks/delete": 10.0,
+}
+
+# Только эти пути можно безопасно повторять и дублировать (hedging)
+API_IDEMPOTENT_PATHS = {"tasks/list", "tasks/pending"}
+
+# ---------------------------------------------------------------------
+# Метрики бота (/metrics: в webhook-режиме на том же порту,
+# в polling — на BOT_METRICS_PORT, если задан)
+# ---------------------------------------------------------------------
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "0"))
+
+API_REQUESTS = REGISTRY.counter(
+    "bot_api_requests_total", "Запросы бота к Next.js API", ("path", "status")
+)
+API_LATENCY = REGISTRY.histogram(
+    "bot_api_request_duration_seconds", "Время запроса к Next.js API", ("path", "status")
+)
+HANDLER_LATENCY = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Время работы хендлера команды", ("command",)
+)
+
+REGISTRY.gauge(
+    "bot_log_records_dropped", "Записи логов, отброшенные из-за полной очереди"
+).set_function(dropped_records)
+
+
+def observe_api_request(path: str, status: str, seconds: float) -> None:
+    API_REQUESTS.labels(path, status).inc()
+    API_LATENCY.labels(path, status).observe(seconds)
+
+
+# Одна HTTP-сессия на весь процесс (keep-alive, пул соединений, кэш DNS)
+api = ApiClient(
+    API_BASE,
+    pool_limit=int(os.getenv("API_POOL_LIMIT", "20")),
+    pool_limit_per_host=int(os.getenv("API_POOL_LIMIT_PER_HOST", "10")),
+    timeout=float(os.getenv("API_TIMEOUT", "10")),
+    endpoint_timeouts=API_ENDPOINT_TIMEOUTS,
+    idempotent_paths=API_IDEMPOTENT_PATHS,
+    max_retries=int(os.getenv("API_MAX_RETRIES", "2")),
+    # пусто — без hedging; например 0.5 — второй запрос через 500 мс
+    hedge_delay=float(os.getenv("API_HEDGE_DELAY") or 0) or None,
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("API_BREAKER_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("API_BREAKER_RESET", "30")),
+    ),
+    on_request=observe_api_request,
+)
+REGISTRY.gauge(
+    "bot_api_connections_reused", "Запросы, ушедшие по уже открытому соединению"
+).set_function(lambda: api.connections_reused)
+REGISTRY.gauge(
+    "bot_api_connections_created", "Открытые новые соединения к API"
+).set_function(lambda: api.connections_created)
+REGISTRY.gauge(
+    "bot_api_circuit_open", "1, если circuit breaker не пропускает запросы"
+).set_function(lambda: 0 if api.breaker.state == "closed" else 1)
+
+# ---------------------------------------------------------------------
+# Режим получения апдейтов: polling (по умолчанию) или webhook
+# ---------------------------------------------------------------------
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# публичный адрес, на который Telegram будет слать апдейты (без пути)
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# Telegram присылает его в X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8080"))
+# при нескольких репликах снимать вебхук на остановке одной из них нельзя
+WEBHOOK_DELETE_ON_SHUTDOWN = os.getenv("WEBHOOK_DELETE_ON_SHUTDOWN", "1") == "1"
+
+if BOT_MODE == "webhook" and not (WEBHOOK_BASE_URL and WEBHOOK_SECRET):
+    raise RuntimeError(
+        "Для BOT_MODE=webhook нужны WEBHOOK_BASE_URL и WEBHOOK_SECRET."
+    )
+
 # ---------------------------------------------------------------------
 # Админы (ТОЛЬКО эти аккаунты имеют доступ к /newtask, /pending, /approve, /reject, /deletetask)
 # ---------------------------------------------------------------------
@@ -62,8 +177,210 @@ def is_admin(user_id: int) -> bool:
     return user_id in ADMINS
 
 
+# ---------------------------------------------------------------------
+# FSM-хранилище: диалог /newtask переживает перезапуск (FSM_STORAGE=sqlite)
+# ---------------------------------------------------------------------
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+
+if FSM_STORAGE == "memory":
+    fsm_storage = MemoryStorage()
+else:
+    fsm_storage = SqliteStorage(
+        os.getenv("FSM_DB_PATH", "bot-fsm.db"),
+        # брошенный на полпути диалог удаляется через сутки
+        ttl=float(os.getenv("FSM_TTL", str(24 * 3600))),
+        cache_ttl=float(os.getenv("FSM_CACHE_TTL", "300")),
+    )
+
 bot = Bot(BOT_TOKEN)
-dp = Dispatcher()
+dp = Dispatcher(storage=fsm_storage)
+
+
+# ---------------------------------------------------------------------
+# Исходящие запросы: общий лимит ~30/с, лимит на чат, приоритеты
+# ---------------------------------------------------------------------
+def telegram_retry_after(error: BaseException) -> float | None:
+    return float(error.retry_after) if isinstance(error, TelegramRetryAfter) else None
+
+
+send_scheduler = SendScheduler(
+    retry_after=telegram_retry_after,
+    global_rate=float(os.getenv("TG_GLOBAL_RATE", "30")),
+    global_burst=float(os.getenv("TG_GLOBAL_BURST", "30")),
+    per_chat_interval=float(os.getenv("TG_PER_CHAT_INTERVAL", "1.0")),
+    per_chat_burst=float(os.getenv("TG_PER_CHAT_BURST", "3")),
+    group_interval=float(os.getenv("TG_GROUP_CHAT_INTERVAL", "3.0")),
+    max_retries=int(os.getenv("TG_SEND_RETRIES", "3")),
+)
+
+# рассылки выставляют PRIORITY_BULK сами; иначе приоритет — по получателю
+send_priority: ContextVar[int | None] = ContextVar("send_priority", default=None)
+
+
+class SendSchedulerMiddleware(BaseRequestMiddleware):
+    """
+    Все запросы к Bot API с chat_id (send*, edit*, copy*, ...) — через планировщик,
+    так что хендлеры просто зовут message.answer / bot.send_message.
+    """
+
+    def __init__(self, scheduler: SendScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        # @username каналов и запросы без чата (answerCallbackQuery, getMe) — напрямую
+        if not isinstance(chat_id, int):
+            return await make_request(bot, method)
+
+        priority = send_priority.get()
+        if priority is None:
+            priority = PRIORITY_ADMIN if is_admin(chat_id) else PRIORITY_USER
+        return await self.scheduler.send(
+            chat_id, lambda: make_request(bot, method), priority=priority
+        )
+
+
+bot.session.middleware(SendSchedulerMiddleware(send_scheduler))
+
+REGISTRY.gauge(
+    "bot_send_queue_depth", "Запросы к Telegram, ждущие общего лимита"
+).set_function(send_scheduler.queue_depth)
+
+
+# ---------------------------------------------------------------------
+# Rate limit на апдейты (до хендлеров и любых запросов к API)
+# ---------------------------------------------------------------------
+class RateLimitMiddleware(BaseMiddleware):
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if self.limiter.check(str(user.id) if user else None):
+            # просто отбрасываем апдейт: ответ в чат — это тоже запрос к Telegram
+            return None
+        return await handler(event, data)
+
+
+update_limiter = RateLimiter(
+    user_rate=float(os.getenv("BOT_RATE_PER_USER", "1")),
+    user_burst=float(os.getenv("BOT_BURST_PER_USER", "5")),
+    global_rate=float(os.getenv("BOT_RATE_GLOBAL", "50")),
+    global_burst=float(os.getenv("BOT_BURST_GLOBAL", "100")),
+)
+
+dp.update.outer_middleware(RateLimitMiddleware(update_limiter))
+
+
+# ---------------------------------------------------------------------
+# Пул воркеров: порядок внутри чата, параллельно между чатами
+# ---------------------------------------------------------------------
+class WorkerPoolMiddleware(BaseMiddleware):
+    def __init__(self, pool: UpdateWorkerPool):
+        self.pool = pool
+
+    async def __call__(self, handler, event, data):
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat else (user.id if user else 0)
+
+        async def job():
+            # raw_state FSM-мидлварь прочитала при постановке в очередь; пока
+            # апдейт ждал, предыдущий апдейт этого чата мог сменить шаг —
+            # перечитываем, чтобы фильтры по состоянию видели актуальное
+            state = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+            return await handler(event, data)
+
+        # в очередь чата; если заполнен весь пул — ждём (backpressure)
+        if not await self.pool.submit(key, job) and chat is not None:
+            # апдейт потерян — скажем об этом, но один раз на затор
+            if self.pool.take_drop_notice(key):
+                try:
+                    await data["bot"].send_message(
+                        chat.id, "⏳ Слишком много запросов подряд — подожди немного и повтори."
+                    )
+                except Exception as e:
+                    log.warning("Drop notice failed", extra={"chatId": chat.id, "error": str(e)})
+        return None
+
+
+update_pool = UpdateWorkerPool(
+    workers=int(os.getenv("BOT_WORKERS", "8")),
+    queue_size=int(os.getenv("BOT_QUEUE_SIZE", "1000")),
+    chat_queue_size=int(os.getenv("BOT_CHAT_QUEUE_SIZE", "20")),
+)
+
+dp.update.outer_middleware(WorkerPoolMiddleware(update_pool))
+
+REGISTRY.gauge(
+    "bot_update_queue_depth", "Апдейты в очередях пула воркеров"
+).set_function(update_pool.queue_depth)
+REGISTRY.gauge(
+    "bot_updates_in_flight", "Апдейты, которые сейчас обрабатываются"
+).set_function(lambda: update_pool.in_flight)
+REGISTRY.gauge(
+    "bot_updates_dropped", "Апдейты, отброшенные из-за полных очередей (с запуска)"
+).set_function(lambda: update_pool.dropped)
+
+
+# ---------------------------------------------------------------------
+# Время работы хендлеров по командам
+# ---------------------------------------------------------------------
+BOT_COMMAND_NAMES = {
+    "start", "tasks", "done", "newtask", "pending", "approve", "reject", "deletetask",
+}
+
+
+def command_label(message: types.Message) -> str:
+    text = message.text or ""
+    if not text.startswith("/"):
+        # шаги диалога /newtask и прочий текст
+        return "text"
+    name = text.split()[0][1:].split("@")[0].lower()
+    return name if name in BOT_COMMAND_NAMES else "other"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.labels(command_label(event)).observe(
+                time.perf_counter() - started
+            )
+
+
+dp.message.middleware(HandlerMetricsMiddleware())
+
+
+# ---------------------------------------------------------------------
+# Плейсхолдер "⏳ ..." — итоговый ответ редактирует его, а не шлёт второе сообщение
+# ---------------------------------------------------------------------
+class Progress:
+    def __init__(self, message: types.Message):
+        self.message = message
+        self.placeholder: types.Message | None = None
+
+    async def start(self, text: str, **kwargs) -> None:
+        self.placeholder = await self.message.answer(text, **kwargs)
+
+    async def answer(self, text: str, **kwargs):
+        """
+        Первый ответ заменяет плейсхолдер, следующие — новыми сообщениями.
+        """
+        placeholder, self.placeholder = self.placeholder, None
+        # edit_text умеет только inline-клавиатуру
+        markup = kwargs.get("reply_markup")
+        if placeholder is not None and (markup is None or isinstance(markup, InlineKeyboardMarkup)):
+            try:
+                return await placeholder.edit_text(text, **kwargs)
+            except TelegramBadRequest:
+                # сообщение удалили или текст совпал — отвечаем как обычно
+                pass
+        return await self.message.answer(text, **kwargs)
 
 
 # ---------------------------------------------------------------------
@@ -370,13 +687,15 @@ async def new_task_deadline(message: types.Message, state: FSMContext):
     try:
         api_resp = await call_api("tasks/create", payload)
     except Exception as e:
-        print("API ERROR /tasks/create:", e)
+        log.warning("API error", extra={"path": "tasks/create", "error": str(e)})
         return await message.answer("❌ Ошибка при обращении к API. Попробуй позже.")
 
     if not api_resp or api_resp.get("error"):
         err = api_resp.get("message") or api_resp.get("error") or "unknown"
         return await message.answer(f"❌ Не удалось сохранить задачу.\nОшибка: {err}")
 
+    task_catalogue.invalidate()
+
     task = api_resp.get("task") or {}
     code = task.get("code") or "UNKNOWN"
 
@@ -393,37 +712,169 @@ async def new_task_deadline(message: types.Message, state: FSMContext):
 # ---------------------------------------------------------------------
 # USER: /tasks — список задач
 # ---------------------------------------------------------------------
+async def load_task_catalogue() -> list[dict]:
+    api_resp = await call_api("tasks/list", {})
+
+    if not api_resp or api_resp.get("error"):
+        api_resp = api_resp or {}
+        raise TaskCatalogueError(
+            api_resp.get("message") or api_resp.get("error") or "unknown"
+        )
+
+    return api_resp.get("tasks") or []
+
+
+TASKS_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "15"))
+PENDING_PAGE_SIZE = int(os.getenv("PENDING_PAGE_SIZE", "10"))
+# запас под заголовок и подсказку внизу страницы
+PAGE_MAX_CHARS = MESSAGE_LIMIT - 500
+
+
+def page_keyboard(prefix: str, page: int, has_next: bool) -> InlineKeyboardMarkup | None:
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"{prefix}:{page - 1}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="Вперёд ▶️", callback_data=f"{prefix}:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
+
+def parse_page(data: str) -> int:
+    _, _, raw = data.partition(":")
+    return int(raw) if raw.isdigit() else 0
+
+
+async def show_page(
+    callback: types.CallbackQuery, text: str, keyboard: InlineKeyboardMarkup | None
+):
+    try:
+        await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=keyboard)
+    except TelegramBadRequest:
+        # двойной клик по той же кнопке: "message is not modified"
+        pass
+    await callback.answer()
+
+
+def render_tasks_pages(tasks: list[dict]) -> list[str]:
+    """
+    Весь каталог, разложенный по страницам, — один раз на версию кэша.
+    """
+    if not tasks:
+        return ["Пока нет активных задач. Загляни позже ✨"]
+
+    blocks = []
+    for t in tasks:
+        code = t.get("code")
+        title = clip(str(t.get("title")), 200)
+        reward = t.get("rewardXp")
+        blocks.append(f"• `{code}` — *{title}* (+{reward} XP)")
+
+    pages = split_pages(blocks, TASKS_PAGE_SIZE, PAGE_MAX_CHARS)
+    texts = []
+    for number, page in enumerate(pages, start=1):
+        header = "📃 *Доступные задачи:*"
+        if len(pages) > 1:
+            header += f" (стр. {number}/{len(pages)})"
+        lines = [header, "", *page, ""]
+        lines.append("Чтобы отправить выполнение, используй:\n`/done КОД_ЗАДАЧИ`")
+        texts.append("\n".join(lines))
+    return texts
+
+
+# Каталог меняется только через /newtask и /deletetask — они и сбрасывают кэш
+task_catalogue = TaskCatalogueCache(
+    load_task_catalogue,
+    ttl=float(os.getenv("TASKS_CACHE_TTL", "60")),
+)
+
+
 @dp.message(Command("tasks"))
 async def tasks_list(message: types.Message):
-    await message.answer("⏳ Загружаю список задач...")
+    reply = Progress(message)
+    if not task_catalogue.is_fresh():
+        await reply.start("⏳ Загружаю список задач...")
 
     try:
-        api_resp = await call_api("tasks/list", {})
+        pages = await task_catalogue.get_rendered(render_tasks_pages)
+    except TaskCatalogueError as e:
+        return await reply.answer(f"❌ Не удалось загрузить задачи.\nОшибка: {e}")
     except Exception as e:
-        print("API ERROR /tasks/list:", e)
-        return await message.answer("❌ Не удалось загрузить задачи.\nОшибка: INTERNAL")
+        log.warning("API error", extra={"path": "tasks/list", "error": str(e)})
+        return await reply.answer("❌ Не удалось загрузить задачи.\nОшибка: INTERNAL")
 
-    if not api_resp or api_resp.get("error"):
-        err = api_resp.get("message") or api_resp.get("error") or "unknown"
-        return await message.answer(f"❌ Не удалось загрузить задачи.\nОшибка: {err}")
+    await reply.answer(
+        pages[0],
+        parse_mode="Markdown",
+        reply_markup=page_keyboard("tasks", 0, len(pages) > 1),
+    )
 
-    tasks = api_resp.get("tasks") or []
 
-    if not tasks:
-        return await message.answer("Пока нет активных задач. Загляни позже ✨")
+@dp.callback_query(F.data.startswith("tasks:"))
+async def tasks_page(callback: types.CallbackQuery):
+    try:
+        pages = await task_catalogue.get_rendered(render_tasks_pages)
+    except Exception as e:
+        log.warning("API error", extra={"path": "tasks/list", "error": str(e)})
+        return await callback.answer("❌ Не удалось загрузить задачи.", show_alert=True)
 
-    lines = ["📃 *Доступные задачи:*", ""]
-    for t in tasks[:15]:
-        code = t.get("code")
-        title = t.get("title")
-        reward = t.get("rewardXp")
-        line = f"• `{code}` — *{title}* (+{reward} XP)"
-        lines.append(line)
+    # каталог мог уменьшиться, пока сообщение висело в чате
+    page = min(parse_page(callback.data), len(pages) - 1)
+    await show_page(callback, pages[page], page_keyboard("tasks", page, page + 1 < len(pages)))
 
-    lines.append("")
-    lines.append("Чтобы отправить выполнение, используй:\n`/done КОД_ЗАДАЧИ`")
 
-    await message.answer("\n".join(lines), parse_mode="Markdown")
+# ---------------------------------------------------------------------
+# Уведомления админам о новых заявках (дайджест раз в окно)
+# ---------------------------------------------------------------------
+ADMIN_NOTIFY = os.getenv("ADMIN_NOTIFY", "1") == "1"
+
+
+def render_submission_digest(items: list[dict]) -> list[str]:
+    """
+    Без Markdown: имена пользователей могут содержать _ и *.
+    """
+    blocks = [
+        f"• {item['taskCode']} — {item['userName']} ({item['userId']}), +{item['rewardXp']} XP\n"
+        f"  /approve {item['completionId']}  /reject {item['completionId']}"
+        for item in items
+    ]
+    pages = split_pages(blocks, len(blocks), PAGE_MAX_CHARS)
+    texts = []
+    for number, page in enumerate(pages, start=1):
+        header = f"🔔 Новые заявки: {len(items)}"
+        if len(pages) > 1:
+            header += f" ({number}/{len(pages)})"
+        texts.append("\n".join([header, "", *page, "", "Все заявки: /pending"]))
+    return texts
+
+
+async def notify_admins(items: list[dict]) -> None:
+    texts = render_submission_digest(items)
+
+    async def notify_one(admin_id: int) -> None:
+        for text in texts:
+            try:
+                await bot.send_message(admin_id, text)
+            except Exception as e:
+                log.warning(
+                    "Admin notification failed",
+                    extra={"adminId": admin_id, "error": str(e)},
+                )
+                return
+
+    # дайджест пропускает вперёд ответы на команды; задачи gather наследуют контекст
+    token = send_priority.set(PRIORITY_BULK)
+    try:
+        # админы параллельно, сообщения одному админу — по порядку
+        await asyncio.gather(*(notify_one(admin_id) for admin_id in ADMINS))
+    finally:
+        send_priority.reset(token)
+
+
+submission_digest: DigestBatcher[dict] = DigestBatcher(
+    notify_admins,
+    window=float(os.getenv("ADMIN_DIGEST_WINDOW", "10")),
+    max_items=int(os.getenv("ADMIN_DIGEST_MAX_ITEMS", "50")),
+)
 
 
 # ---------------------------------------------------------------------
@@ -443,7 +894,8 @@ async def submit_task(message: types.Message):
     task_code = args[1].strip().upper()
     user_id = message.from_user.id
 
-    await message.answer(
+    reply = Progress(message)
+    await reply.start(
         f"📩 Отправляю заявку на выполнение задачи `{task_code}`...",
         parse_mode="Markdown",
     )
@@ -456,18 +908,18 @@ async def submit_task(message: types.Message):
     try:
         api_resp = await call_api("tasks/submit", payload)
     except Exception as e:
-        print("API ERROR /tasks/submit:", e)
-        return await message.answer("❌ Ошибка при обращении к API. Попробуй позже.")
+        log.warning("API error", extra={"path": "tasks/submit", "error": str(e)})
+        return await reply.answer("❌ Ошибка при обращении к API. Попробуй позже.")
 
     if not api_resp:
-        return await message.answer(
+        return await reply.answer(
             "❌ Не удалось отправить выполнение.\nОшибка: пустой ответ от API."
         )
 
     # если бэк вернул error — это реально ошибка
     if api_resp.get("error"):
         err = api_resp.get("message") or api_resp.get("error") or "unknown"
-        return await message.answer(
+        return await reply.answer(
             f"❌ Не удалось отправить выполнение.\nОшибка: {err}"
         )
 
@@ -477,13 +929,13 @@ async def submit_task(message: types.Message):
 
     # 🔹 когда задача не найдена / уже неактивна
     if status == "task_not_found":
-        return await message.answer(
+        return await reply.answer(
             "❗ Задача с таким кодом не найдена.\n"
             "Проверь код через /tasks и попробуй ещё раз.",
         )
 
     if status == "task_inactive":
-        return await message.answer(
+        return await reply.answer(
             "⚠ Эта задача больше не активна.\n"
             "Выбери другую задачу через /tasks.",
         )
@@ -492,30 +944,43 @@ async def submit_task(message: types.Message):
     if status == "limit_reached":
         if task_type == "daily":
             # ежедневка — уже делал сегодня
-            return await message.answer(
+            return await reply.answer(
                 "⚠ Ты уже забрал XP за эту ежедневную задачу сегодня.\n"
                 "Возвращайся завтра, чтобы получить ещё.",
             )
         else:
             # разовая или многократная
             if max_for_user is None:
-                return await message.answer(
+                return await reply.answer(
                     "⚠ Лимит выполнений для этой задачи уже достигнут.",
                 )
-            return await message.answer(
+            return await reply.answer(
                 "⚠ Лимит выполнений для этой задачи достигнут.\n"
                 f"Ты уже выполнил её максимум {max_for_user} раз.",
             )
 
     # 🔹 На будущее (если когда-то решим возвращать already_submitted)
     if status == "already_submitted":
-        return await message.answer(
+        return await reply.answer(
             "⚠ Ты уже отправлял выполнение этой задачи.\n"
             "Жди решения админа.",
         )
 
     # 🔹 Обычный кейс — заявка создана, статус pending
-    return await message.answer(
+    if ADMIN_NOTIFY:
+        submission_digest.add(
+            {
+                "completionId": api_resp.get("completionId"),
+                "taskCode": api_resp.get("taskCode") or task_code,
+                "rewardXp": api_resp.get("rewardXp") or 0,
+                "userId": user_id,
+                "userName": message.from_user.full_name,
+            }
+        )
+    # у админов в кэше /pending уже не вся очередь — и без уведомлений тоже
+    pending_pages.invalidate()
+
+    return await reply.answer(
         "✅ Заявка на выполнение задачи отправлена.\n"
         "После проверки админом XP будет начислен.",
     )
@@ -524,37 +989,38 @@ async def submit_task(message: types.Message):
 # ---------------------------------------------------------------------
 # ADMIN: /pending — список заявок на проверку
 # ---------------------------------------------------------------------
-@dp.message(Command("pending"))
-async def pending_list(message: types.Message):
-    if not is_admin(message.from_user.id):
-        return await message.answer("⛔ Доступ запрещён.")
+async def fetch_pending_page(
+    cursor: str | None, limit: int
+) -> tuple[list[dict], str | None]:
+    payload = {"limit": limit}
+    if cursor:
+        payload["cursor"] = cursor
 
-    await message.answer("⏳ Загружаю заявки на проверку...")
+    api_resp = await call_api("tasks/pending", payload)
 
-    payload = {"limit": 30}
+    if not api_resp or api_resp.get("error"):
+        api_resp = api_resp or {}
+        raise PageLoadError(api_resp.get("message") or api_resp.get("error") or "unknown")
 
-    try:
-        api_resp = await call_api("tasks/pending", payload)
-    except Exception as e:
-        print("API ERROR /tasks/pending:", e)
-        return await message.answer("❌ Ошибка при обращении к API. Попробуй позже.")
+    return api_resp.get("items") or [], api_resp.get("nextCursor")
 
-    if not api_resp or api_resp.get("error"):
-        err = api_resp.get("message") or api_resp.get("error") or "unknown"
-        return await message.answer(
-            f"❌ Не удалось загрузить заявки.\nОшибка: {err}"
-        )
 
-    items = api_resp.get("items") or []
+pending_pages = PendingPages(
+    fetch_pending_page,
+    page_size=PENDING_PAGE_SIZE,
+    ttl=float(os.getenv("PENDING_PAGE_TTL", "30")),
+)
 
-    if not items:
-        return await message.answer("✅ Нет заявок в статусе pending.")
 
+def render_pending_page(items: list[dict], page: int, offset: int) -> str:
     lines: list[str] = ["🟡 *Заявки, ожидающие проверки:*", ""]
-    for idx, item in enumerate(items[:20], start=1):
+    if page > 0:
+        lines[0] += f" (стр. {page + 1})"
+
+    for idx, item in enumerate(items, start=offset + 1):
         completion_id = item.get("id")
         task_code = item.get("taskCode") or "NO_CODE"
-        task_title = item.get("taskTitle") or "Без названия"
+        task_title = clip(item.get("taskTitle") or "Без названия", 200)
         user_id = item.get("telegramUserId")
         reward = item.get("rewardXp") or 0
 
@@ -568,7 +1034,195 @@ async def pending_list(message: types.Message):
         )
         lines.append(line)
 
-    await message.answer("\n".join(lines), parse_mode="Markdown")
+    lines.append(
+        "Пачкой: `/approve 1 3 5-8`, `/reject 2,4` (номера из этого списка) "
+        "или `/approve all` — вся очередь."
+    )
+
+    return "\n".join(lines)
+
+
+async def load_pending_page(
+    admin_id: int, page: int
+) -> tuple[str, InlineKeyboardMarkup | None] | None:
+    result = await pending_pages.page(admin_id, page)
+    if result is None:
+        return None
+    items, has_next = result
+
+    offset = page * pending_pages.page_size
+    # номера сквозные по всем просмотренным страницам — их понимают /approve и /reject
+    listed = last_pending_ids.setdefault(admin_id, [])
+    listed[offset:offset + pending_pages.page_size] = [str(item.get("id")) for item in items]
+
+    return render_pending_page(items, page, offset), page_keyboard("pending", page, has_next)
+
+
+@dp.message(Command("pending"))
+async def pending_list(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return await message.answer("⛔ Доступ запрещён.")
+
+    reply = Progress(message)
+    await reply.start("⏳ Загружаю заявки на проверку...")
+
+    admin_id = message.from_user.id
+    pending_pages.reset(admin_id)
+    last_pending_ids[admin_id] = []
+
+    try:
+        text, keyboard = await load_pending_page(admin_id, 0)
+    except PageLoadError as e:
+        return await reply.answer(f"❌ Не удалось загрузить заявки.\nОшибка: {e}")
+    except Exception as e:
+        log.warning("API error", extra={"path": "tasks/pending", "error": str(e)})
+        return await reply.answer("❌ Ошибка при обращении к API. Попробуй позже.")
+
+    if not last_pending_ids[admin_id]:
+        return await reply.answer("✅ Нет заявок в статусе pending.")
+
+    await reply.answer(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+@dp.callback_query(F.data.startswith("pending:"))
+async def pending_page(callback: types.CallbackQuery):
+    admin_id = callback.from_user.id
+    if not is_admin(admin_id):
+        return await callback.answer("⛔ Доступ запрещён.", show_alert=True)
+
+    try:
+        loaded = await load_pending_page(admin_id, parse_page(callback.data))
+    except Exception as e:
+        log.warning("API error", extra={"path": "tasks/pending", "error": str(e)})
+        return await callback.answer("❌ Не удалось загрузить заявки.", show_alert=True)
+
+    if loaded is None:
+        # кнопка из старого списка (бот перезапускался или был новый /pending)
+        return await callback.answer("Список устарел — открой /pending заново.", show_alert=True)
+
+    text, keyboard = loaded
+    await show_page(callback, text, keyboard)
+
+
+# ---------------------------------------------------------------------
+# ADMIN: пачечная обработка заявок (/approve и /reject с несколькими ID)
+# ---------------------------------------------------------------------
+
+# последний показанный /pending каждому админу: номер в списке -> ID заявки
+last_pending_ids: dict[int, list[str]] = {}
+
+BULK_REVIEW_CONCURRENCY = int(os.getenv("BULK_REVIEW_CONCURRENCY", "5"))
+# размер страницы, которой /approve all и /reject all выбирают очередь (максимум API)
+ALL_PENDING_PAGE_SIZE = 200
+
+
+async def fetch_all_pending_ids() -> list[str]:
+    """
+    Все заявки в pending, а не только показанные админу страницы:
+    идём по keyset-курсорам до конца очереди.
+    """
+    ids: list[str] = []
+    cursor = None
+    while True:
+        items, cursor = await fetch_pending_page(cursor, ALL_PENDING_PAGE_SIZE)
+        ids.extend(str(item.get("id")) for item in items)
+        if cursor is None:
+            return ids
+
+
+async def resolve_completion_ids(
+    tokens: list[str], admin_id: int
+) -> tuple[list[str], list[str]]:
+    """
+    Разбирает аргументы /approve и /reject:
+    `all` (вся очередь pending), номера `3`, диапазоны `5-8`
+    (из последнего /pending) или сами ID заявок.
+    Возвращает (ID без повторов, нераспознанные токены).
+    """
+    listed = last_pending_ids.get(admin_id) or []
+    ids: list[str] = []
+    bad: list[str] = []
+    all_loaded = False
+
+    for raw in ",".join(tokens).split(","):
+        token = raw.strip().lstrip("#")
+        if not token:
+            continue
+
+        if token.lower() == "all":
+            if not all_loaded:
+                ids.extend(await fetch_all_pending_ids())
+                all_loaded = True
+            continue
+
+        start, sep, end = token.partition("-")
+        # голое число без открытого /pending — это сам ID заявки
+        if start.isdigit() and (not sep or end.isdigit()) and (listed or sep):
+            first = int(start)
+            last = int(end) if sep else first
+            if not listed or not (1 <= first <= last <= len(listed)):
+                bad.append(raw)
+                continue
+            ids.extend(listed[first - 1:last])
+            continue
+
+        ids.append(token)
+
+    return list(dict.fromkeys(ids)), bad
+
+
+async def bulk_review(message: types.Message, action: str, ids: list[str]):
+    path = f"tasks/{action}"
+    admin_id = message.from_user.id
+    sem = asyncio.Semaphore(BULK_REVIEW_CONCURRENCY)
+
+    async def review_one(completion_id: str):
+        payload = {
+            "completionId": completion_id,
+            "adminId": admin_id,
+        }
+        async with sem:
+            try:
+                api_resp = await call_api(path, payload)
+            except Exception as e:
+                log.warning("API error", extra={"path": path, "error": str(e)})
+                return completion_id, None, "INTERNAL"
+
+        if not api_resp or api_resp.get("error"):
+            api_resp = api_resp or {}
+            err = api_resp.get("message") or api_resp.get("error") or "unknown"
+            return completion_id, None, err
+        return completion_id, api_resp, None
+
+    verb = "Подтверждаю" if action == "approve" else "Отклоняю"
+    reply = Progress(message)
+    await reply.start(f"⏳ {verb} заявки: {len(ids)} шт...")
+
+    results = await asyncio.gather(*(review_one(cid) for cid in ids))
+    pending_pages.invalidate()
+
+    done = [resp for _, resp, err in results if err is None]
+    failed = [(cid, err) for cid, _, err in results if err is not None]
+
+    if action == "approve":
+        total_reward = sum((resp.get("rewardXp") or 0) for resp in done)
+        lines = [
+            f"🎉 Одобрено: {len(done)} из {len(ids)}",
+            f"Начислено всего: +{total_reward} XP",
+        ]
+    else:
+        lines = [f"🚫 Отклонено: {len(done)} из {len(ids)}"]
+
+    if failed:
+        lines.append("")
+        lines.append(f"❌ Ошибки ({len(failed)}):")
+        # держимся подальше от лимита Telegram в 4096 символов
+        for cid, err in failed[:30]:
+            lines.append(f"• `{cid}` — {err}")
+        if len(failed) > 30:
+            lines.append(f"…и ещё {len(failed) - 30}")
+
+    await reply.answer("\n".join(lines), parse_mode="Markdown")
 
 
 # ---------------------------------------------------------------------
@@ -584,13 +1238,30 @@ async def approve_completion(message: types.Message):
         return await message.answer(
             "❗ Укажи ID заявки.\n\n"
             "Пример:\n"
-            "`/approve 123e4567-e89b-12d3-a456-426614174000`",
+            "`/approve 123e4567-e89b-12d3-a456-426614174000`\n"
+            "`/approve 1 3 5-8` — номера из /pending, `/approve all` — вся очередь",
             parse_mode="Markdown",
         )
 
-    completion_id = args[1].strip()
+    try:
+        ids, bad = await resolve_completion_ids(args[1:], message.from_user.id)
+    except Exception as e:
+        log.warning("API error", extra={"path": "tasks/pending", "error": str(e)})
+        return await message.answer("❌ Не удалось загрузить заявки. Попробуй позже.")
+    if not ids and not bad and "all" in message.text.lower():
+        return await message.answer("✅ Нет заявок в статусе pending.")
+    if bad or not ids:
+        return await message.answer(
+            f"❗ Не понял: {', '.join(bad) or message.text}\n"
+            "Номера работают по последнему списку /pending."
+        )
+    if len(ids) > 1:
+        return await bulk_review(message, "approve", ids)
+
+    completion_id = ids[0]
 
-    await message.answer(
+    reply = Progress(message)
+    await reply.start(
         f"✅ Подтверждаю заявку `{completion_id}` и начисляю XP...",
         parse_mode="Markdown",
     )
@@ -603,22 +1274,24 @@ async def approve_completion(message: types.Message):
     try:
         api_resp = await call_api("tasks/approve", payload)
     except Exception as e:
-        print("API ERROR /tasks/approve:", e)
-        return await message.answer("❌ Ошибка при обращении к API. Попробуй позже.")
+        log.warning("API error", extra={"path": "tasks/approve", "error": str(e)})
+        return await reply.answer("❌ Ошибка при обращении к API. Попробуй позже.")
 
     if not api_resp or api_resp.get("error"):
         err = api_resp.get("message") or api_resp.get("error") or "unknown"
-        return await message.answer(
+        return await reply.answer(
             f"❌ Не удалось подтвердить заявку.\nОшибка: {err}"
         )
 
+    pending_pages.invalidate()
+
     reward_xp = api_resp.get("rewardXp") or 0
     profile = api_resp.get("profile") or {}
     stats = profile.get("stats") or {}
     level = stats.get("level")
     total_xp = stats.get("totalXp")
 
-    await message.answer(
+    await reply.answer(
         "🎉 Заявка одобрена.\n"
         f"Начислено: +{reward_xp} XP\n"
         f"Новый уровень: {level}\n"
@@ -640,13 +1313,30 @@ async def reject_completion(message: types.Message):
         return await message.answer(
             "❗ Укажи ID заявки.\n\n"
             "Пример:\n"
-            "`/reject 123e4567-e89b-12d3-a456-426614174000`",
+            "`/reject 123e4567-e89b-12d3-a456-426614174000`\n"
+            "`/reject 1 3 5-8` — номера из /pending, `/reject all` — вся очередь",
             parse_mode="Markdown",
         )
 
-    completion_id = args[1].strip()
+    try:
+        ids, bad = await resolve_completion_ids(args[1:], message.from_user.id)
+    except Exception as e:
+        log.warning("API error", extra={"path": "tasks/pending", "error": str(e)})
+        return await message.answer("❌ Не удалось загрузить заявки. Попробуй позже.")
+    if not ids and not bad and "all" in message.text.lower():
+        return await message.answer("✅ Нет заявок в статусе pending.")
+    if bad or not ids:
+        return await message.answer(
+            f"❗ Не понял: {', '.join(bad) or message.text}\n"
+            "Номера работают по последнему списку /pending."
+        )
+    if len(ids) > 1:
+        return await bulk_review(message, "reject", ids)
+
+    completion_id = ids[0]
 
-    await message.answer(
+    reply = Progress(message)
+    await reply.start(
         f"🚫 Отклоняю заявку `{completion_id}`...",
         parse_mode="Markdown",
     )
@@ -659,16 +1349,18 @@ async def reject_completion(message: types.Message):
     try:
         api_resp = await call_api("tasks/reject", payload)
     except Exception as e:
-        print("API ERROR /tasks/reject:", e)
-        return await message.answer("❌ Ошибка при обращении к API. Попробуй позже.")
+        log.warning("API error", extra={"path": "tasks/reject", "error": str(e)})
+        return await reply.answer("❌ Ошибка при обращении к API. Попробуй позже.")
 
     if not api_resp or api_resp.get("error"):
         err = api_resp.get("message") or api_resp.get("error") or "unknown"
-        return await message.answer(
+        return await reply.answer(
             f"❌ Не удалось отклонить заявку.\nОшибка: {err}"
         )
 
-    await message.answer(
+    pending_pages.invalidate()
+
+    await reply.answer(
         "✅ Заявка отклонена.",
         parse_mode="Markdown",
     )
@@ -700,7 +1392,8 @@ async def delete_task(message: types.Message):
 
     task_code = args[1].strip().upper()
 
-    await message.answer(
+    reply = Progress(message)
+    await reply.start(
         f"🗑 Отключаю задачу `{task_code}` (уберу её из Earn)...",
         parse_mode="Markdown",
     )
@@ -712,8 +1405,8 @@ async def delete_task(message: types.Message):
     try:
         api_resp = await call_api("tasks/delete", payload)
     except Exception as e:
-        print("API ERROR /tasks/delete:", e)
-        return await message.answer("❌ Ошибка при обращении к API. Попробуй позже.")
+        log.warning("API error", extra={"path": "tasks/delete", "error": str(e)})
+        return await reply.answer("❌ Ошибка при обращении к API. Попробуй позже.")
 
     if not api_resp or api_resp.get("error"):
         err = (
@@ -721,10 +1414,12 @@ async def delete_task(message: types.Message):
             or api_resp.get("error")
             or "unknown"
         )
-        return await message.answer(
+        return await reply.answer(
             f"❌ Не удалось отключить задачу.\nОшибка: {err}"
         )
 
+    task_catalogue.invalidate()
+
     already_deleted = bool(api_resp.get("alreadyDeleted"))
     is_active = api_resp.get("isActive")
 
@@ -739,26 +1434,14 @@ async def delete_task(message: types.Message):
             "Она больше не будет появляться в разделе Earn."
         )
 
-    await message.answer(text, parse_mode="Markdown")
+    await reply.answer(text, parse_mode="Markdown")
 
 
 # ---------------------------------------------------------------------
 # Функция обращения к Next.js API
 # ---------------------------------------------------------------------
 async def call_api(path: str, payload: dict):
-    url = f"{API_BASE}/{path}"
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload) as resp:
-            try:
-                data = await resp.json()
-            except Exception:
-                text = await resp.text()
-                print("API BAD RESPONSE TEXT:", text)
-                return {"error": "INVALID_RESPONSE", "raw": text}
-
-            if resp.status >= 400:
-                print("API ERROR STATUS:", resp.status, data)
-            return data
+    return await api.post(path, payload)
 
 
 # ---------------------------------------------------------------------
@@ -777,22 +1460,144 @@ async def setup_bot_commands(bot: Bot):
     ]
 
     await bot.set_my_commands(commands)
-    print("✅ Bot commands set in Telegram")
+    log.info("Bot commands set in Telegram")
+
+
+# ---------------------------------------------------------------------
+# Webhook: регистрация/снятие и aiohttp-приложение
+# ---------------------------------------------------------------------
+async def on_webhook_startup(bot: Bot):
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    log.info("Webhook set", extra={"url": f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}"})
+
+
+async def on_webhook_shutdown(bot: Bot):
+    if WEBHOOK_DELETE_ON_SHUTDOWN:
+        await bot.delete_webhook()
+        log.info("Webhook removed")
+
+
+async def webhook_health(request: web.Request) -> web.Response:
+    return web.json_response({"ok": True})
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=REGISTRY.render().encode(),
+        headers={"Content-Type": CONTENT_TYPE},
+    )
+
+
+async def start_metrics_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, BOT_METRICS_PORT).start()
+    log.info("Metrics server started", extra={"host": WEBHOOK_HOST, "port": BOT_METRICS_PORT})
+    return runner
+
+
+def build_webhook_app() -> web.Application:
+    app = web.Application()
+
+    # неверный секрет → 401, до разбора апдейта
+    # handle_in_background=False: апдейт сразу уходит в пул воркеров,
+    # а при полной очереди ответ Telegram задерживается (backpressure)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=False,
+    ).register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/health", webhook_health)
+    app.router.add_get("/metrics", metrics_handler)
+
+    dp.startup.register(on_webhook_startup)
+    dp.shutdown.register(on_webhook_shutdown)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook():
+    runner = web.AppRunner(build_webhook_app())
+    await runner.setup()
+
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    log.info(
+        "Webhook server started",
+        extra={"host": WEBHOOK_HOST, "port": WEBHOOK_PORT, "path": WEBHOOK_PATH},
+    )
+
+    # ждём SIGTERM/SIGINT, затем штатно гасим сервер (он снимет вебхук)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
 
 
 # ---------------------------------------------------------------------
 # START BOT
 # ---------------------------------------------------------------------
 async def main():
-    print("🤖 LifeOS Admin Bot started")
-    print(f"➡ MINIAPP_URL = {MINIAPP_URL}")
-    print(f"➡ API_BASE = {API_BASE}")
-    print(f"➡ ADMINS = {ADMINS}")
+    log.info(
+        "LifeOS Admin Bot started",
+        extra={
+            "miniappUrl": MINIAPP_URL,
+            "apiBase": API_BASE,
+            "admins": sorted(ADMINS),
+            "mode": BOT_MODE,
+        },
+    )
 
-    # настроим команды в Telegram
-    await setup_bot_commands(bot)
+    update_pool.start()
+    metrics_runner: web.AppRunner | None = None
 
-    await dp.start_polling(bot)
+    try:
+        # настроим команды в Telegram
+        await setup_bot_commands(bot)
+
+        if BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            if BOT_METRICS_PORT:
+                metrics_runner = await start_metrics_server()
+            # на случай, если раньше бот работал через вебхук
+            await bot.delete_webhook()
+            # апдейты по одному кладутся в пул; параллелизм — внутри пула
+            await dp.start_polling(bot, handle_as_tasks=False)
+    finally:
+        # дорабатываем уже принятые апдейты, пока сессии ещё открыты
+        await update_pool.stop()
+        # хвост дайджеста — пока сессия бота ещё открыта
+        await submission_digest.stop()
+        await fsm_storage.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        log.info(
+            "LifeOS Admin Bot stopped",
+            extra={
+                "updatePool": update_pool.stats(),
+                "sendScheduler": send_scheduler.stats(),
+                "adminDigest": submission_digest.stats(),
+                "api": api.stats(),
+                "droppedLogRecords": dropped_records(),
+            },
+        )
+        await api.close()
+        await bot.session.close()
+        shutdown_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+"""
+Лимиты выполнений задач на пользователя — те же правила, что в tasks/submit
+(app/api/xp/tasks/submit/route.ts):
+
+    single — maxUserCompletions раз за всё время (по умолчанию 1)
+    daily  — maxUserCompletions раз за сутки (по умолчанию 1)
+    multi  — maxUserCompletions раз, без лимита, если он не задан
+
+Счётчик на (userId, taskId) — одно int-значение `день << 32 | счётчик`.
+Для daily день хранится вместе со счётчиком: если он не сегодняшний,
+счётчик считается нулевым (ленивый сброс на границе суток, без фоновых
+проходов); сами записи прошлых суток удаляет prune() при каждом снапшоте.
+Проверка и учёт — один поиск в словаре. Для задач без лимита
+счётчик не ведётся вовсе: проверять нечего, а память росла бы со всей историей.
+
+Счётчики сохраняются в снапшот журнала (dump/restore), так что при старте
+проигрывается только хвост журнала после снапшота.
+"""
+import json
+import time
+from typing import Iterable, NamedTuple, Optional
+
+TASK_TYPES = ("single", "daily", "multi")
+
+COUNT_BITS = 32
+COUNT_MASK = (1 << COUNT_BITS) - 1
+
+
+class TaskPolicy(NamedTuple):
+    task_type: str
+    max_completions: Optional[int]  # None — без ограничения
+
+
+def policy_for(task_type: Optional[str], max_user_completions: Optional[int] = None) -> TaskPolicy:
+    """
+    TaskPolicy из полей задачи (taskType / maxUserCompletions) с дефолтами tasks/submit.
+    """
+    task_type = task_type if task_type in TASK_TYPES else "single"
+    limit = max_user_completions if max_user_completions and max_user_completions > 0 else None
+    if limit is None and task_type != "multi":
+        limit = 1
+    return TaskPolicy(task_type, limit)
+
+
+def load_policies(path: Optional[str]) -> dict[str, TaskPolicy]:
+    """
+    JSON вида {"<taskId>": {"taskType": "daily", "maxUserCompletions": 1}, ...}.
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    return {
+        task_id: policy_for(spec.get("taskType"), spec.get("maxUserCompletions"))
+        for task_id, spec in raw.items()
+    }
+
+
+class CompletionPolicy:
+    def __init__(
+        self,
+        policies: Optional[dict[str, TaskPolicy]] = None,
+        default: TaskPolicy = TaskPolicy("multi", None),
+        day_offset_hours: float = 0.0,
+    ):
+        self._policies = dict(policies or {})
+        self.default = default
+        # сутки считаем по UTC со сдвигом (XP_DAY_OFFSET_HOURS=3 — полночь по Москве)
+        self._day_offset = day_offset_hours * 3600
+        self._counters: dict[tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def policy(self, task_id: str) -> TaskPolicy:
+        return self._policies.get(task_id, self.default)
+
+    def _day(self, now: Optional[float]) -> int:
+        return int(((now if now is not None else time.time()) + self._day_offset) // 86400)
+
+    def try_acquire(
+        self, user_id: str, task_id: str, now: Optional[float] = None
+    ) -> tuple[bool, int, TaskPolicy]:
+        """
+        Проверяет лимит и сразу учитывает выполнение, если он не исчерпан.
+        Возвращает (разрешено, выполнений с учётом этого, политика).
+        Проверка и запись идут без await — между ними никто не вклинится.
+        """
+        policy = self.policy(task_id)
+        if policy.max_completions is None:
+            return True, 0, policy
+
+        key = (user_id, task_id)
+        day = self._day(now) if policy.task_type == "daily" else 0
+
+        packed = self._counters.get(key, 0)
+        count = packed & COUNT_MASK if packed >> COUNT_BITS == day else 0
+
+        if policy.max_completions is not None and count >= policy.max_completions:
+            return False, count, policy
+
+        self._counters[key] = day << COUNT_BITS | (count + 1)
+        return True, count + 1, policy
+
+    def release(self, user_id: str, task_id: str, now: Optional[float] = None) -> None:
+        """
+        Откатывает try_acquire, если начисление так и не состоялось
+        (не записалось в журнал или хранилище).
+        """
+        policy = self.policy(task_id)
+        if policy.max_completions is None:
+            return
+        key = (user_id, task_id)
+        day = self._day(now) if policy.task_type == "daily" else 0
+
+        packed = self._counters.get(key)
+        if packed is None or packed >> COUNT_BITS != day or not packed & COUNT_MASK:
+            return
+        if packed & COUNT_MASK == 1:
+            del self._counters[key]
+        else:
+            self._counters[key] = packed - 1
+
+    def load(self, events: Iterable[dict]) -> None:
+        """
+        Прогрев из журнала начислений (event_log.iter_events()) по времени событий.
+        """
+        for event in events:
+            self.try_acquire(event["userId"], event["taskId"], now=event["ts"])
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """
+        Удаляет daily-счётчики прошлых суток: они уже ничего не ограничивают,
+        а юзер, не вернувшийся к задаче, держал бы запись вечно.
+        """
+        # день в счётчике пишут только daily; 0 — у остальных типов
+        today = self._day(now)
+        stale = [
+            key
+            for key, packed in self._counters.items()
+            if packed >> COUNT_BITS not in (0, today)
+        ]
+        for key in stale:
+            del self._counters[key]
+        return len(stale)
+
+    def dump(self) -> list | None:
+        """
+        Счётчики для снапшота журнала; заодно чистит вчерашние daily.
+        """
+        self.prune()
+        return [
+            [user_id, task_id, packed]
+            for (user_id, task_id), packed in self._counters.items()
+        ]
+
+    def restore(self, counters: list) -> None:
+        self._counters = {(user_id, task_id): packed for user_id, task_id, packed in counters}
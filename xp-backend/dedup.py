@@ -0,0 +1,89 @@
+"""
+Индекс идемпотентности для повторных запросов.
+
+Ключ -> сохранённый ответ, с TTL и ограничением по размеру.
+TTL у всех записей одинаковый, поэтому порядок вставки совпадает
+с порядком истечения: протухшие записи всегда в начале OrderedDict,
+и их вытеснение — O(1) на операцию без сканирования.
+
+reserve() занимает ключ до выполнения запроса, put() кладёт ответ,
+release() освобождает ключ, если ответ запоминать не нужно (ошибка,
+отказ по лимиту). Занятый ключ живёт pending_ttl: если запрос так и не
+дошёл ни до put(), ни до release(), повтор через это время выполнится
+заново. Такая запись может протухнуть раньше стоящих перед ней, поэтому
+срок ещё раз проверяется при поиске; из OrderedDict она уйдёт, когда
+дойдёт до начала. Тот же интерфейс у SharedDedupIndex (shared_state.py),
+где между reserve() и put() может прийти повтор из другого процесса.
+"""
+import time
+from collections import OrderedDict
+from typing import Any
+
+# ключ занят, ответа ещё нет
+_PENDING = object()
+
+
+class DedupIndex:
+    def __init__(self, ttl: float = 600.0, max_size: int = 100_000, pending_ttl: float = 30.0):
+        self._ttl = ttl
+        self._pending_ttl = pending_ttl
+        self._max_size = max_size
+        # key -> (expires_at, value)
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            key, (expires_at, _) = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self._max_size:
+                break
+            entries.popitem(last=False)
+
+    def get(self, key: str) -> Any | None:
+        now = time.monotonic()
+        self._evict(now)
+
+        entry = self._entries.get(key)
+        if entry is None or entry[1] is _PENDING:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def reserve(self, key: str) -> tuple[bool, Any | None]:
+        """
+        (True, None) — ключ занят нами, запрос можно выполнять;
+        (False, ответ) — повтор, отдаём сохранённый ответ;
+        (False, None) — тот же запрос ещё выполняется.
+        """
+        now = time.monotonic()
+        self._evict(now)
+
+        entry = self._entries.get(key)
+        if entry is None or (entry[1] is _PENDING and entry[0] <= now):
+            self.misses += 1
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self._pending_ttl, _PENDING)
+            return True, None
+        if entry[1] is _PENDING:
+            return False, None
+        self.hits += 1
+        return False, entry[1]
+
+    def release(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is _PENDING:
+            del self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.monotonic()
+        # перевставляем в конец, чтобы порядок остался упорядоченным по времени
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self._ttl, value)
+        self._evict(now)
@@ -0,0 +1,91 @@
+"""
+Склейка частых событий в одно сообщение-дайджест.
+
+Первое событие запускает таймер на window секунд; всё, что пришло
+за это время, уходит одной пачкой в flush(items). В пачке не больше
+max_items событий: набралось столько раньше конца окна — пачка уходит
+сразу, а остаток открывает следующее окно. Пока событий нет, ничего
+не крутится.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DigestBatcher(Generic[T]):
+    def __init__(
+        self,
+        flush: Callable[[list[T]], Awaitable[None]],
+        *,
+        window: float = 10.0,
+        max_items: int = 100,
+    ):
+        self._flush = flush
+        self._window = window
+        self._max_items = max_items
+
+        self._items: list[T] = []
+        self._full = asyncio.Event()
+        self._timer: asyncio.Task | None = None
+
+        self.batches = 0
+        self.items_sent = 0
+
+    def add(self, item: T) -> None:
+        self._items.append(item)
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        if len(self._items) >= self._max_items:
+            self._full.set()
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), self._window)
+        except asyncio.TimeoutError:
+            pass
+        self._full.clear()
+        # пока пачка отправляется, таймер занят: пачки уходят по порядку
+        await self._send(self._take())
+        self._timer = None
+        if self._items:
+            # остаток сверх max_items и пришедшее во время отправки
+            self._timer = asyncio.create_task(self._flush_later())
+            if len(self._items) >= self._max_items:
+                self._full.set()
+
+    def _take(self) -> list[T]:
+        items = self._items[: self._max_items]
+        del self._items[: self._max_items]
+        return items
+
+    async def _send(self, items: list[T]) -> None:
+        if not items:
+            return
+        try:
+            await self._flush(items)
+        except Exception:
+            log.exception("Digest flush failed", extra={"items": len(items)})
+            return
+        self.batches += 1
+        self.items_sent += len(items)
+
+    async def stop(self) -> None:
+        """
+        Отправляет накопленное, не дожидаясь конца окна.
+        """
+        while self._timer is not None:
+            self._full.set()
+            await self._timer
+        while self._items:
+            await self._send(self._take())
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._items),
+            "batches": self.batches,
+            "itemsSent": self.items_sent,
+        }
@@ -0,0 +1,393 @@
+"""
+Append-only журнал начислений XP с сегментами и снапшотами балансов.
+
+Журнал — каталог с файлами-сегментами `<первый seq>.seg`. Каждая запись:
+
+    [u32 длина payload][u32 crc32 payload][payload]
+    payload = <u64 seq><f64 ts><i64 amount><u16 len userId><u16 len taskId> userId taskId
+
+Сегмент закрывается, когда превышает segment_bytes, и дальше не меняется.
+Чтение идёт через mmap: последовательный проход без копирования в буферы.
+
+Снапшот `snapshot-<seq>.json` — балансы после события seq (и, по желанию,
+другое производное состояние на тот же seq — extra). При старте берётся
+последний снапшот и проигрывается только хвост журнала после него.
+Оборванная запись в конце последнего сегмента (падение посреди write)
+определяется по длине/crc и отрезается.
+
+shared=True — в журнал пишут несколько процессов (воркеры serve.py).
+Запись идёт под flock на файле `append.lock`: процесс сначала дочитывает
+чужие записи (так seq остаются сквозными, а ротация сегмента видна всем),
+потом дописывает свою. poll() отдаёт чужие записи без блокировки:
+недописанная запись в конце файла просто не проходит проверку длины/crc
+и будет прочитана в следующий раз.
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+
+_FRAME = struct.Struct("<II")
+_HEAD = struct.Struct("<QdqHH")
+
+SEGMENT_SUFFIX = ".seg"
+SNAPSHOT_PREFIX = "snapshot-"
+LOCK_FILE = "append.lock"
+
+
+MAX_FIELD_BYTES = 0xFFFF
+
+
+def _encode(seq: int, ts: float, user_id: str, task_id: str, amount: int) -> bytes:
+    user = user_id.encode()
+    task = task_id.encode()
+    if len(user) > MAX_FIELD_BYTES or len(task) > MAX_FIELD_BYTES:
+        raise ValueError("userId/taskId не помещаются в запись журнала")
+    payload = _HEAD.pack(seq, ts, amount, len(user), len(task)) + user + task
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _scan(buf, start: int = 0) -> Iterator[tuple[int, dict]]:
+    """
+    Идёт по записям буфера; отдаёт (offset конца записи, событие).
+    Останавливается на первой неполной или битой записи.
+    """
+    offset = start
+    size = len(buf)
+    while offset + _FRAME.size <= size:
+        length, crc = _FRAME.unpack_from(buf, offset)
+        body_start = offset + _FRAME.size
+        body_end = body_start + length
+        if length < _HEAD.size or body_end > size:
+            return
+        if zlib.crc32(buf[body_start:body_end]) != crc:
+            return
+
+        seq, ts, amount, user_len, task_len = _HEAD.unpack_from(buf, body_start)
+        user_start = body_start + _HEAD.size
+        task_start = user_start + user_len
+        yield body_end, {
+            "seq": seq,
+            "ts": ts,
+            "userId": bytes(buf[user_start:task_start]).decode(),
+            "taskId": bytes(buf[task_start:task_start + task_len]).decode(),
+            "amount": amount,
+        }
+        offset = body_end
+
+
+class EventLog:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        shared: bool = False,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.shared = shared
+
+        # балансы по журналу (снапшот + хвост) — из них пишутся новые снапшоты
+        self.balances: dict[str, int] = {}
+        self.last_seq = 0
+        self.snapshot_seq = 0
+        # extra из последнего снапшота (None — снапшота не было или extra не писали)
+        self.snapshot_extra: dict | None = None
+
+        self._file = None
+        self._file_size = 0
+        self._segment_first = 0
+
+        self._lock_fd: int | None = None
+        # чужие записи, дочитанные перед своей append (shared) — отдаст poll()
+        self._foreign: list[dict] = []
+
+    # -----------------------------------------------------------------
+    # Файлы
+    # -----------------------------------------------------------------
+    def _segments(self) -> list[tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                first_seq = int(name[: -len(SEGMENT_SUFFIX)])
+                segments.append((first_seq, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _snapshots(self) -> list[tuple[int, str]]:
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".json"):
+                seq = int(name[len(SNAPSHOT_PREFIX): -len(".json")])
+                snapshots.append((seq, os.path.join(self.directory, name)))
+        return sorted(snapshots)
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{first_seq:020d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self, first_seq: int, from_start: bool = False) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self._segment_path(first_seq), "ab")
+        self._segment_first = first_seq
+        # from_start — сегмент начал другой процесс, его записи ещё дочитаем
+        self._file_size = 0 if from_start else self._file.tell()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if self._lock_fd is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _apply(self, event: dict) -> None:
+        self.balances[event["userId"]] = self.balances.get(event["userId"], 0) + event["amount"]
+        self.last_seq = event["seq"]
+
+    # -----------------------------------------------------------------
+    # Старт: снапшот + хвост
+    # -----------------------------------------------------------------
+    def open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if self.shared:
+            self._lock_fd = os.open(
+                os.path.join(self.directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644
+            )
+        # под блокировкой: не отрезать "хвост", который сосед как раз дописывает
+        with self._locked():
+            self._replay()
+
+    def _replay(self) -> None:
+        snapshots = self._snapshots()
+        if snapshots:
+            self.snapshot_seq, path = snapshots[-1]
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.balances = snapshot["balances"]
+            self.snapshot_extra = snapshot.get("extra")
+            self.last_seq = self.snapshot_seq
+
+        segments = self._segments()
+        for i, (first_seq, path) in enumerate(segments):
+            # сегмент целиком до снапшота — не читаем
+            next_first = segments[i + 1][0] if i + 1 < len(segments) else None
+            if next_first is not None and next_first <= self.snapshot_seq + 1:
+                continue
+
+            good_end = 0
+            for good_end, event in self._iter_file(path):
+                if event["seq"] > self.last_seq:
+                    self._apply(event)
+
+            # отрезаем оборванный хвост последнего сегмента
+            if next_first is None and good_end < os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(good_end)
+
+        if segments:
+            self._open_segment(segments[-1][0])
+        else:
+            self._open_segment(self.last_seq + 1)
+
+    @staticmethod
+    def _iter_file(path: str) -> Iterator[tuple[int, dict]]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                # memoryview нужно отпустить до закрытия mmap
+                with memoryview(buf) as view:
+                    yield from _scan(view)
+
+    # -----------------------------------------------------------------
+    # Несколько процессов (shared)
+    # -----------------------------------------------------------------
+    def _catch_up(self) -> list[dict]:
+        """
+        Дочитывает записи других процессов: хвост текущего сегмента
+        и следующие сегменты, если кто-то уже сделал ротацию.
+        """
+        events: list[dict] = []
+        while True:
+            # новый сегмент появляется только после того, как старый дописан:
+            # если он уже есть до чтения, то дочитанный старый — полный
+            rotated = self._next_segment_exists()
+
+            path = self._segment_path(self._segment_first)
+            size = os.path.getsize(path)
+            if size > self._file_size:
+                with open(path, "rb") as f:
+                    f.seek(self._file_size)
+                    data = f.read(size - self._file_size)
+                consumed = 0
+                for consumed, event in _scan(data):
+                    self._apply(event)
+                    events.append(event)
+                self._file_size += consumed
+
+            if rotated:
+                self._open_segment(self.last_seq + 1, from_start=True)
+            elif not self._next_segment_exists():
+                return events
+            # иначе ротация случилась, пока читали, — ещё круг
+
+    def _next_segment_exists(self) -> bool:
+        next_first = self.last_seq + 1
+        return next_first != self._segment_first and os.path.exists(
+            self._segment_path(next_first)
+        )
+
+    def poll(self) -> list[dict]:
+        """
+        Записи других процессов с прошлого вызова (только shared).
+        """
+        if not self.shared:
+            return []
+        events, self._foreign = self._foreign, []
+        events.extend(self._catch_up())
+        return events
+
+    # -----------------------------------------------------------------
+    # Запись
+    # -----------------------------------------------------------------
+    def append(self, user_id: str, task_id: str, amount: int, ts: float | None = None) -> int:
+        with self._locked():
+            if self.shared:
+                self._foreign.extend(self._catch_up())
+
+            if self._file_size >= self.segment_bytes:
+                self._open_segment(self.last_seq + 1)
+
+            seq = self.last_seq + 1
+            record = _encode(seq, ts if ts is not None else time.time(), user_id, task_id, amount)
+            self._file.write(record)
+            # в ОС сразу: переживаем падение процесса, fsync — на снапшотах/закрытии
+            self._file.flush()
+            self._file_size += len(record)
+
+        self.last_seq = seq
+        self.balances[user_id] = self.balances.get(user_id, 0) + amount
+        return seq
+
+    def append_many(self, records: list[tuple[str, str, int]], ts: float | None = None) -> int:
+        """
+        Пачка (user_id, task_id, amount) под одной блокировкой и одним flush.
+        Возвращает seq последней записи.
+        """
+        ts = ts if ts is not None else time.time()
+        with self._locked():
+            if self.shared:
+                self._foreign.extend(self._catch_up())
+
+            # кодируем всё до записи: ошибка в одной записи не оставит в файле половину пачки
+            first = self.last_seq + 1
+            encoded = [
+                _encode(seq, ts, user_id, task_id, amount)
+                for seq, (user_id, task_id, amount) in enumerate(records, start=first)
+            ]
+            seq = first - 1
+            for record in encoded:
+                if self._file_size >= self.segment_bytes:
+                    self._open_segment(seq + 1)
+                seq += 1
+                self._file.write(record)
+                self._file_size += len(record)
+            self._file.flush()
+
+        self.last_seq = seq
+        balances = self.balances
+        for user_id, _, amount in records:
+            balances[user_id] = balances.get(user_id, 0) + amount
+        return seq
+
+    def sync(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def write_snapshot(self, balances: dict[str, int], seq: int, extra: dict | None = None) -> None:
+        """
+        Атомарно пишет снапшот (через временный файл) и удаляет старые.
+        Можно звать из потока с копией balances (и extra).
+        """
+        path = os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{seq:020d}.json")
+        # у каждого процесса свой временный файл: соседи могут писать тот же seq
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            snapshot = {"seq": seq, "balances": balances}
+            if extra is not None:
+                snapshot["extra"] = extra
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        for old_seq, old_path in self._snapshots():
+            if old_seq < seq:
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    # уже удалил соседний процесс
+                    pass
+        self.snapshot_seq = max(self.snapshot_seq, seq)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # -----------------------------------------------------------------
+    # Чтение (лента / история)
+    # -----------------------------------------------------------------
+    def iter_events(self, since_seq: int = 0, user_id: str | None = None) -> Iterator[dict]:
+        """
+        Потоково отдаёт события с seq > since_seq (по возрастанию),
+        начиная с сегмента, где лежит since_seq + 1.
+        """
+        segments = self._segments()
+        start = 0
+        for i, (first_seq, _) in enumerate(segments):
+            if first_seq <= since_seq + 1:
+                start = i
+
+        for _, path in segments[start:]:
+            for _, event in self._iter_file(path):
+                if event["seq"] <= since_seq:
+                    continue
+                if user_id is not None and event["userId"] != user_id:
+                    continue
+                yield event
+
+    def user_history(
+        self, user_id: str, since_seq: int, limit: int, max_scan: int
+    ) -> tuple[list[dict], int | None]:
+        """
+        События юзера с seq > since_seq, просмотрев не больше max_scan
+        записей журнала: индекса по юзерам нет, и без предела редкий юзер
+        стоил бы прохода по всем сегментам.
+        Возвращает (события, since для следующего запроса или None — дальше пусто).
+        """
+        events: list[dict] = []
+        scanned = 0
+        for event in self.iter_events(since_seq):
+            if scanned >= max_scan:
+                return events, event["seq"] - 1
+            scanned += 1
+            if event["userId"] != user_id:
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                return events, event["seq"]
+        return events, None
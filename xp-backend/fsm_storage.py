@@ -0,0 +1,156 @@
+"""
+FSM-хранилище aiogram в SQLite с кэшем в памяти процесса.
+
+Диалог /newtask переживает перезапуск бота и виден другим репликам
+на той же машине (общий файл SQLite в режиме WAL).
+
+Чтение — через кэш: FSMContextMiddleware спрашивает состояние на каждом
+апдейте, а у большинства пользователей диалога нет вовсе — такой ответ
+("пусто") тоже кэшируется, и обычный /tasks не трогает базу.
+Запись — сразу в SQLite (один UPSERT) и в кэш.
+
+Брошенные диалоги истекают через ttl после последнего шага: протухшие
+строки не читаются и периодически удаляются, так что база не растёт.
+
+Если реплик несколько и апдейты одного чата могут попасть в разные,
+ставь cache_ttl=0 (FSM_CACHE_TTL=0) — тогда каждое чтение идёт в базу.
+"""
+import copy
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key        TEXT PRIMARY KEY,
+    state      TEXT,
+    data       TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fsm_expires ON fsm (expires_at);
+"""
+
+# протухшие диалоги удаляем не на каждой записи, а раз в столько записей
+_SWEEP_EVERY = 500
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id,
+            getattr(key, "business_connection_id", None),
+            key.destiny,
+        )
+    )
+
+
+class SqliteStorage(BaseStorage):
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 24 * 3600,
+        cache_ttl: float = 300.0,
+        cache_size: int = 10_000,
+    ):
+        self._ttl = ttl
+        self._cache_ttl = cache_ttl
+        self._cache_size = cache_size
+        # key -> (закэшировано до, state, data)
+        self._cache: OrderedDict[str, tuple[float, Optional[str], Dict[str, Any]]] = OrderedDict()
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self._path = path
+        self._conn: sqlite3.Connection | None = None
+        self._db().executescript(_SCHEMA)
+
+    # -----------------------------------------------------------------
+    # Кэш + база
+    # -----------------------------------------------------------------
+    def _db(self) -> sqlite3.Connection:
+        # Dispatcher закрывает хранилище на shutdown раньше, чем пул воркеров
+        # доработает очередь, — тогда соединение просто откроется снова
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._path, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        return self._conn
+
+    def _load(self, key: str) -> tuple[Optional[str], Dict[str, Any]]:
+        now = time.time()
+        cached = self._cache.get(key)
+        if cached is not None and now < cached[0]:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached[1], cached[2]
+
+        self.misses += 1
+        rows = self._db().execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchall()
+        state, data = (rows[0][0], json.loads(rows[0][1])) if rows else (None, {})
+        self._remember(key, state, data, now)
+        return state, data
+
+    def _remember(self, key: str, state: Optional[str], data: Dict[str, Any], now: float) -> None:
+        if self._cache_ttl <= 0:
+            return
+        self._cache[key] = (now + self._cache_ttl, state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _save(self, key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        now = time.time()
+        if state is None and not data:
+            # диалог закончен — строка не нужна
+            self._db().execute("DELETE FROM fsm WHERE key = ?", (key,))
+        else:
+            self._db().execute(
+                "INSERT INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "state = excluded.state, data = excluded.data, expires_at = excluded.expires_at",
+                (key, state, json.dumps(data, ensure_ascii=False), now + self._ttl),
+            )
+        self._remember(key, state, data, now)
+
+        self._writes += 1
+        if self._writes % _SWEEP_EVERY == 0:
+            self._db().execute("DELETE FROM fsm WHERE expires_at <= ?", (now,))
+
+    # -----------------------------------------------------------------
+    # BaseStorage
+    # -----------------------------------------------------------------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = _key(key)
+        _, data = self._load(k)
+        self._save(k, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(_key(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = _key(key)
+        state, _ = self._load(k)
+        self._save(k, state, copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        # копия: хендлер может менять dict, не трогая кэш
+        return copy.deepcopy(self._load(_key(key))[1])
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
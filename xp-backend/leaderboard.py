@@ -0,0 +1,63 @@
+"""
+Лидерборд по totalXp с запросами ранга за O(log n).
+
+Внутри — SortedList ключей (-totalXp, userId) и словарь текущих балансов.
+Обновление — удалить старый ключ и вставить новый, оба O(log n);
+топ-N, ранг пользователя и соседи вокруг него — bisect + срез.
+При равном XP выше тот, у кого userId меньше (порядок стабилен).
+"""
+from typing import Iterable
+
+from sortedcontainers import SortedList
+
+
+class Leaderboard:
+    def __init__(self, balances: Iterable[tuple[str, int]] = ()):
+        self.load(balances)
+
+    def load(self, balances: Iterable[tuple[str, int]]) -> None:
+        """
+        Полностью пересобирает лидерборд (прогрев при старте).
+        """
+        self._totals: dict[str, int] = dict(balances)
+        # массовая загрузка одной сортировкой — без n отдельных вставок
+        self._ranking = SortedList((-xp, user_id) for user_id, xp in self._totals.items())
+
+    def __len__(self) -> int:
+        return len(self._totals)
+
+    def update(self, user_id: str, total_xp: int) -> None:
+        old = self._totals.get(user_id)
+        if old == total_xp:
+            return
+        if old is not None:
+            self._ranking.remove((-old, user_id))
+        self._ranking.add((-total_xp, user_id))
+        self._totals[user_id] = total_xp
+
+    def _entries(self, start: int, stop: int) -> list[dict]:
+        return [
+            {"rank": start + i + 1, "userId": user_id, "totalXp": -neg_xp}
+            for i, (neg_xp, user_id) in enumerate(self._ranking.islice(start, stop))
+        ]
+
+    def top(self, limit: int) -> list[dict]:
+        return self._entries(0, limit)
+
+    def _index(self, user_id: str) -> int | None:
+        total = self._totals.get(user_id)
+        if total is None:
+            return None
+        return self._ranking.bisect_left((-total, user_id))
+
+    def rank(self, user_id: str) -> dict | None:
+        idx = self._index(user_id)
+        if idx is None:
+            return None
+        return {"rank": idx + 1, "userId": user_id, "totalXp": self._totals[user_id]}
+
+    def around(self, user_id: str, radius: int) -> list[dict] | None:
+        idx = self._index(user_id)
+        if idx is None:
+            return None
+        return self._entries(max(0, idx - radius), idx + radius + 1)
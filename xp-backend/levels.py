@@ -0,0 +1,48 @@
+"""
+Кривая уровней — та же, что в calculateLevelStats (app/api/xp/tasks/approve/route.ts):
+переход L -> L+1 стоит 500 * L XP.
+
+Пороги totalXp для каждого уровня считаются один раз при импорте,
+уровень по totalXp ищется бинарным поиском по таблице.
+"""
+import bisect
+from typing import Iterable
+
+XP_PER_LEVEL_STEP = 500
+MAX_LEVEL = 10_000
+
+# LEVEL_THRESHOLDS[i] — сколько всего XP нужно для уровня i + 1
+LEVEL_THRESHOLDS: list[int] = [0]
+for _level in range(1, MAX_LEVEL):
+    LEVEL_THRESHOLDS.append(LEVEL_THRESHOLDS[-1] + XP_PER_LEVEL_STEP * _level)
+del _level
+
+
+def level_for(total_xp: int) -> int:
+    return bisect.bisect_right(LEVEL_THRESHOLDS, max(0, total_xp))
+
+
+def level_stats(total_xp: int) -> dict:
+    """
+    level / currentXp / nextLevelXp / progressPercent — как XpStats на фронте.
+    """
+    total_xp = max(0, total_xp)
+    level = level_for(total_xp)
+    current_xp = total_xp - LEVEL_THRESHOLDS[level - 1]
+    next_level_xp = XP_PER_LEVEL_STEP * level
+
+    return {
+        "level": level,
+        "currentXp": current_xp,
+        "nextLevelXp": next_level_xp,
+        "progressPercent": min(100.0, current_xp / next_level_xp * 100),
+    }
+
+
+def levels_for(totals: Iterable[int]) -> list[int]:
+    """
+    Пакетная конвертация: уровни для многих пользователей за один вызов.
+    """
+    thresholds = LEVEL_THRESHOLDS
+    bisect_right = bisect.bisect_right
+    return [bisect_right(thresholds, total if total > 0 else 0) for total in totals]
@@ -0,0 +1,157 @@
+"""
+Структурные JSON-логи без блокировки event loop.
+
+Хендлеры приложения кладут записи в ограниченную очередь (put_nowait),
+а форматирование и запись в stdout делает фоновый поток QueueListener.
+Если очередь переполнена — запись отбрасывается и считается,
+но запрос из-за медленного приёмника логов не ждёт.
+
+Настройки через окружение:
+    LOG_LEVEL=INFO                          — уровень по умолчанию
+    LOG_LEVELS=api_client=DEBUG,xp.claims=WARNING   — уровни по модулям
+    LOG_SAMPLE=xp.claims=0.05               — доля записей, которые пишем
+    LOG_QUEUE_SIZE=10000
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# стандартные поля LogRecord — всё остальное считаем extra-полями события
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                event[key] = value
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # форматирование JSON — в фоновом потоке; здесь только то,
+        # что нельзя отложить (аргументы и traceback могут измениться)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю rate записей уровня INFO и ниже; WARNING+ — всегда.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class RedactQueryFilter(logging.Filter):
+    """
+    Убирает query string из access-лога uvicorn: в ней бывает initData
+    (GET /xp/stream), а подписанный initData — это credential пользователя.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        # uvicorn.access: (client_addr, method, full_path, http_version, status_code)
+        if isinstance(args, tuple) and len(args) >= 3 and isinstance(args[2], str):
+            path, sep, _ = args[2].partition("?")
+            if sep:
+                record.args = (*args[:2], f"{path}?<redacted>", *args[3:])
+        return True
+
+
+def _parse_pairs(raw: str) -> dict[str, str]:
+    pairs = {}
+    for item in raw.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: DroppingQueueHandler | None = None
+
+
+def setup_logging() -> DroppingQueueHandler:
+    """
+    Настраивает root-логгер один раз на процесс. Повторный вызов ничего не меняет.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return _queue_handler
+
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+
+    sink = logging.StreamHandler(sys.stdout)
+    sink.setFormatter(JsonFormatter())
+
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(
+        log_queue, sink, respect_handler_level=False
+    )
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for name, level in _parse_pairs(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    for name, rate in _parse_pairs(os.getenv("LOG_SAMPLE", "")).items():
+        logging.getLogger(name).addFilter(SamplingFilter(float(rate)))
+
+    logging.getLogger("uvicorn.access").addFilter(RedactQueryFilter())
+
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+def shutdown_logging() -> None:
+    """
+    Дописывает всё, что осталось в очереди, и останавливает фоновый поток.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
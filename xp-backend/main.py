@@ -1,44 +1,585 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import tempfile
+import time
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime, timezone
 
-app = FastAPI()
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
+from dotenv import load_dotenv
+
+from telegram_auth import InitDataVerifier, init_data_user_id
+from xp_store import InstrumentedXpStore, XpStore, open_store
+from write_behind import WriteBehindBuffer
+from dedup import DedupIndex
+from rate_limit import RateLimiter
+from metrics import CONTENT_TYPE, REGISTRY
+from leaderboard import Leaderboard
+from levels import level_for, level_stats, levels_for
+from event_log import EventLog
+from pubsub import Broker
+from completion_policy import CompletionPolicy, load_policies, policy_for
+from shared_state import (
+    SharedCompletionPolicy,
+    SharedDedupIndex,
+    SharedRateLimiter,
+    SharedState,
+)
+from log_setup import dropped_records, setup_logging, shutdown_logging
+
+load_dotenv()
+
+# JSON-логи через очередь и фоновый поток; успешные claim'ы можно
+# прореживать: LOG_SAMPLE=xp.claims=0.05
+setup_logging()
+claims_log = logging.getLogger("xp.claims")
+log = logging.getLogger("xp")
+
+# ----- Токен бота для проверки подписи initData -----
+
+BOT_TOKEN_RAW = os.getenv("TELEGRAM_BOT_TOKEN")
+
+if not BOT_TOKEN_RAW:
+    raise RuntimeError(
+        "TELEGRAM_BOT_TOKEN не задан. "
+        "Он нужен для проверки подписи initData."
+    )
+
+BOT_TOKEN = BOT_TOKEN_RAW.strip().strip('"').strip("'")
+
+# секретный ключ выводится из токена один раз — при старте процесса
+init_data_verifier = InitDataVerifier(
+    BOT_TOKEN,
+    cache_size=int(os.getenv("INIT_DATA_CACHE_SIZE", "10000")),
+    max_age=float(os.getenv("INIT_DATA_MAX_AGE", str(24 * 3600))),
+)
+
+# ----- Метрики (/metrics) -----
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "xp_http_requests_total", "HTTP-запросы к XP-сервису", ("path", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "xp_http_request_duration_seconds", "Время обработки HTTP-запроса", ("path",)
+)
+STORE_LATENCY = REGISTRY.histogram(
+    "xp_store_operation_duration_seconds", "Время операций XpStore", ("op",)
+)
+FLUSH_BATCH_SIZE = REGISTRY.histogram(
+    "xp_write_behind_batch_size",
+    "Размер пачки write-behind",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+FLUSH_LATENCY = REGISTRY.histogram(
+    "xp_write_behind_flush_duration_seconds", "Время сброса пачки write-behind"
+)
+REGISTRY.gauge(
+    "xp_log_records_dropped", "Записи логов, отброшенные из-за полной очереди"
+).set_function(dropped_records)
+
+# ----- Хранилище XP (XP_STORE=sqlite|memory, XP_DB_PATH) -----
+
+xp_store: XpStore = InstrumentedXpStore(
+    open_store(),
+    lambda op, seconds: STORE_LATENCY.labels(op).observe(seconds),
+)
+
+
+# ----- Несколько воркеров (serve.py выставляет XP_SHARED_STATE=1) -----
+
+# балансы — в общей SQLite (XP_DB_PATH), идемпотентность, rate limit
+# и счётчики выполнений — в XP_SHARED_DB_PATH, журнал — под flock
+SHARED_STATE = os.getenv("XP_SHARED_STATE", "0") == "1"
+
+if SHARED_STATE and not xp_store.durable:
+    raise RuntimeError("XP_SHARED_STATE=1 работает только с XP_STORE=sqlite.")
+
+shared_state = (
+    SharedState(os.getenv("XP_SHARED_DB_PATH", "xp-shared.db")) if SHARED_STATE else None
+)
+# как часто подтягивать в лидерборд начисления соседних воркеров
+SHARED_SYNC_INTERVAL = float(os.getenv("XP_SHARED_SYNC_INTERVAL", "0.5"))
+
+
+def _observe_flush(batch_size: int, seconds: float) -> None:
+    FLUSH_BATCH_SIZE.observe(batch_size)
+    FLUSH_LATENCY.observe(seconds)
+
+
+# начисления копятся в памяти и пишутся в хранилище пачками;
+# у нескольких воркеров — сразу в базу, иначе соседи видят устаревший баланс
+xp_writes = WriteBehindBuffer(
+    xp_store,
+    max_pending=0 if SHARED_STATE else int(os.getenv("XP_FLUSH_MAX_PENDING", "1000")),
+    flush_interval_ms=int(os.getenv("XP_FLUSH_INTERVAL_MS", "50")),
+    on_flush=_observe_flush,
+)
+REGISTRY.gauge(
+    "xp_write_behind_pending_users", "Пользователи с несброшенными начислениями"
+).set_function(lambda: xp_writes.stats()["pendingUsers"])
+
+# повторы /xp/claim (ретраи клиента) отдают исходный ответ, не трогая хранилище
+if SHARED_STATE:
+    claim_dedup = SharedDedupIndex(
+        shared_state,
+        ttl=float(os.getenv("XP_DEDUP_TTL", "600")),
+        encode=jsonable_encoder,
+    )
+else:
+    claim_dedup = DedupIndex(
+        ttl=float(os.getenv("XP_DEDUP_TTL", "600")),
+        max_size=int(os.getenv("XP_DEDUP_MAX_SIZE", "100000")),
+    )
+
+# ранги считаются в памяти; заполняется из хранилища при старте
+leaderboard = Leaderboard()
+
+# ----- Push-обновления балансов (SSE, /xp/stream) -----
+
+xp_updates = Broker(
+    queue_size=int(os.getenv("XP_STREAM_QUEUE_SIZE", "16")),
+    max_subscribers=int(os.getenv("XP_STREAM_MAX_SUBSCRIBERS", "50000")),
+)
+# прокси рвут молчащие соединения; комментарий SSE раз в интервал держит их
+XP_STREAM_HEARTBEAT = float(os.getenv("XP_STREAM_HEARTBEAT", "25"))
+SSE_PING = b": ping\n\n"
+
+
+def _xp_update_frame(user_id: str, total_xp: int) -> bytes:
+    stats = level_stats(total_xp)
+    data = {
+        "userId": user_id,
+        "totalXp": total_xp,
+        "level": stats["level"],
+        "currentXp": stats["currentXp"],
+        "nextLevelXp": stats["nextLevelXp"],
+    }
+    return f"event: xp\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+def _store_seq(seq: int) -> int | None:
+    # отметку журнала в хранилище ведёт только единственный процесс:
+    # у нескольких воркеров seq чередуются, и доигрывать хвост некому
+    return None if SHARED_STATE else seq
+
+
+def balance_changed(user_id: str, total_xp: int) -> None:
+    """
+    Новый баланс: ранг в лидерборде и push подписчикам этого пользователя.
+    """
+    leaderboard.update(user_id, total_xp)
+    # кадр собираем, только если кто-то слушает
+    if xp_updates.has_subscribers(user_id):
+        xp_updates.publish(user_id, _xp_update_frame(user_id, total_xp))
+
+
+async def _stream_heartbeat_loop() -> None:
+    while True:
+        await asyncio.sleep(XP_STREAM_HEARTBEAT)
+        xp_updates.heartbeat(SSE_PING)
+
+
+def _close_streams_on_exit() -> None:
+    """
+    uvicorn доходит до shutdown в lifespan, только когда допишутся все ответы,
+    а SSE-поток сам не кончается. Поэтому подписки закрываем прямо по
+    SIGTERM/SIGINT и дальше отдаём сигнал обработчику uvicorn.
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(xp_updates.close)
+            previous(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            # не главный поток (например, тестовый клиент) — сигналов не ждём
+            return
+
+
+# ----- Лимиты выполнений задач (single / daily / multi) -----
+
+# политики задач: XP_TASK_POLICIES_FILE — JSON {taskId: {taskType, maxUserCompletions}};
+# задачи не из файла идут по политике по умолчанию (multi без лимита — как раньше)
+completion_policy_args = dict(
+    policies=load_policies(os.getenv("XP_TASK_POLICIES_FILE")),
+    default=policy_for(
+        os.getenv("XP_DEFAULT_TASK_TYPE", "multi"),
+        int(os.getenv("XP_DEFAULT_MAX_COMPLETIONS", "0")),
+    ),
+    day_offset_hours=float(os.getenv("XP_DAY_OFFSET_HOURS", "0")),
+)
+completion_policy = (
+    SharedCompletionPolicy(shared_state, **completion_policy_args)
+    if SHARED_STATE
+    else CompletionPolicy(**completion_policy_args)
+)
+
+# ----- Журнал начислений (история + восстановление балансов) -----
+
+event_log = EventLog(
+    os.getenv("XP_EVENT_LOG_DIR", "xp-events"),
+    segment_bytes=int(os.getenv("XP_EVENT_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+    shared=SHARED_STATE,
+)
+EVENT_SNAPSHOT_EVERY = int(os.getenv("XP_EVENT_SNAPSHOT_EVERY", "10000"))
+EVENT_SNAPSHOT_INTERVAL = float(os.getenv("XP_EVENT_SNAPSHOT_INTERVAL", "60"))
+
+
+def _snapshot_extra() -> dict | None:
+    # счётчики выполнений на тот же seq: при старте — только хвост журнала
+    counters = completion_policy.dump()
+    return {"completionCounters": counters} if counters is not None else None
+
+
+def _replay_into_store() -> None:
+    """
+    Начисления, подтверждённые клиенту, но не успевшие из write-behind
+    буфера в базу (падение процесса), доигрываем из журнала.
+    """
+    applied = xp_store.applied_seq()
+    if applied is None:
+        # база без отметки (старая или после запуска несколькими
+        # воркерами) — считаем, что она совпадает с журналом
+        xp_store.set_applied_seq(event_log.last_seq)
+        return
+    if applied >= event_log.last_seq:
+        return
+
+    deltas: dict[str, int] = {}
+    events = 0
+    for event in event_log.iter_events(since_seq=applied):
+        deltas[event["userId"]] = deltas.get(event["userId"], 0) + event["amount"]
+        events += 1
+    xp_store.increment_many(deltas, event_log.last_seq)
+    log.warning(
+        "Replayed event log tail into store",
+        extra={"fromSeq": applied, "toSeq": event_log.last_seq, "events": events, "users": len(deltas)},
+    )
+
+
+async def _snapshot_loop() -> None:
+    while True:
+        await asyncio.sleep(EVENT_SNAPSHOT_INTERVAL)
+        if event_log.last_seq - event_log.snapshot_seq < EVENT_SNAPSHOT_EVERY:
+            continue
+        # копии снимаем в loop, сериализацию и fsync — в потоке
+        try:
+            await asyncio.to_thread(
+                event_log.write_snapshot,
+                dict(event_log.balances),
+                event_log.last_seq,
+                _snapshot_extra(),
+            )
+        except Exception:
+            logging.getLogger("xp.events").exception("Snapshot failed")
+
+
+async def _shared_sync_loop() -> None:
+    """
+    Начисления соседних воркеров видны по общему журналу;
+    их пользователей перечитываем из базы и обновляем в лидерборде.
+    """
+    while True:
+        await asyncio.sleep(SHARED_SYNC_INTERVAL)
+        try:
+            for user_id in {event["userId"] for event in event_log.poll()}:
+                balance_changed(user_id, xp_store.get(user_id))
+        except Exception:
+            log.exception("Shared state sync failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # прогрев до первого запроса: журнал, счётчики, лидерборд (он же
+    # прочитывает всю таблицу балансов и поднимает её страницы в кэш)
+    started = time.perf_counter()
+
+    # снапшот + хвост журнала; балансы из него нужны, только если
+    # хранилище само их не сохраняет (XP_STORE=memory)
+    event_log.open()
+    if not xp_store.durable:
+        for user_id, total_xp in event_log.balances.items():
+            xp_store.set(user_id, total_xp)
+    elif SHARED_STATE:
+        # воркеры пишут в базу сразу после журнала, отметку не ведут;
+        # стираем старую, чтобы одиночный запуск потом не доиграл лишнего
+        xp_store.set_applied_seq(None)
+    else:
+        _replay_into_store()
+
+    # счётчики выполнений — из снапшота плюс хвост журнала; у снапшота
+    # без счётчиков (записан до их появления) — по всей истории
+    counters = (event_log.snapshot_extra or {}).get("completionCounters")
+    if counters is not None:
+        completion_policy.restore(counters)
+    completion_policy.load(
+        event_log.iter_events(since_seq=event_log.snapshot_seq if counters is not None else 0)
+    )
+
+    leaderboard.load(xp_store.all_balances())
+    xp_writes.start()
+    _close_streams_on_exit()
+    background = [
+        asyncio.create_task(_snapshot_loop()),
+        asyncio.create_task(_stream_heartbeat_loop()),
+    ]
+    if SHARED_STATE:
+        background.append(asyncio.create_task(_shared_sync_loop()))
+
+    log.info(
+        "Worker ready",
+        extra={
+            "pid": os.getpid(),
+            "sharedState": SHARED_STATE,
+            "users": len(leaderboard),
+            "eventSeq": event_log.last_seq,
+            "warmUpMs": round((time.perf_counter() - started) * 1000, 1),
+        },
+    )
+    yield
+    for task in background:
+        task.cancel()
+    # на случай остановки без сигнала; клиенты переподключатся к живому воркеру
+    xp_updates.close()
+    # сначала досбрасываем буфер, потом закрываем хранилище;
+    # снапшот и закрытие журнала — даже если финальный сброс не удался
+    try:
+        await xp_writes.stop()
+    except Exception:
+        log.exception("Final write-behind flush failed")
+    xp_store.close()
+    event_log.write_snapshot(dict(event_log.balances), event_log.last_seq, _snapshot_extra())
+    event_log.close()
+    if shared_state is not None:
+        shared_state.close()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+# ----- Rate limit (до парсинга тела и любых обращений к хранилищу) -----
+
+# ключ — адрес клиента; за прокси serve.py включает proxy_headers, доверяя
+# X-Forwarded-For только адресам из FORWARDED_ALLOW_IPS
+http_limiter_args = dict(
+    user_rate=float(os.getenv("XP_RATE_PER_CLIENT", "5")),
+    user_burst=float(os.getenv("XP_BURST_PER_CLIENT", "20")),
+    global_rate=float(os.getenv("XP_RATE_GLOBAL", "2000")),
+    global_burst=float(os.getenv("XP_BURST_GLOBAL", "4000")),
+)
+# у нескольких воркеров лимиты общие, а не свои в каждом процессе
+http_limiter = (
+    SharedRateLimiter(
+        shared_state,
+        scope="ip",
+        **http_limiter_args,
+        workers=int(os.getenv("XP_WORKERS") or 1),
+    )
+    if SHARED_STATE
+    else RateLimiter(
+        **http_limiter_args,
+        max_users=int(os.getenv("XP_RATE_MAX_CLIENTS", "50000")),
+    )
+)
+
+# адрес клиента делят все юзеры за одним NAT/прокси и он не мешает одному
+# юзеру менять адреса — поэтому claim'ы ещё и лимитируются по подписанному userId
+claim_limiter_args = dict(
+    user_rate=float(os.getenv("XP_RATE_PER_USER", "2")),
+    user_burst=float(os.getenv("XP_BURST_PER_USER", "10")),
+    global_rate=None,
+)
+claim_limiter = (
+    SharedRateLimiter(shared_state, scope="tg", **claim_limiter_args)
+    if SHARED_STATE
+    else RateLimiter(
+        **claim_limiter_args,
+        max_users=int(os.getenv("XP_RATE_MAX_USERS", "50000")),
+    )
+)
+
+RATE_LIMIT_EXEMPT_PATHS = {"/health", "/metrics"}
+
+# несколько проверок общей базы подряд — одной транзакцией (см. shared_state.py)
+shared_transaction = shared_state.transaction if SHARED_STATE else nullcontext
+
+
+class RateLimitMiddleware:
+    """
+    Чистый ASGI-middleware: отказ 429 отдаётся до того,
+    как FastAPI начнёт читать и валидировать тело запроса.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        client = scope.get("client")
+        retry_after = self.limiter.check(client[0] if client else None)
+        if retry_after:
+            response = JSONResponse(
+                {"ok": False, "error": "RATE_LIMITED"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+            return await response(scope, receive, send)
+
+        return await self.app(scope, receive, send)
+
+
+app.add_middleware(RateLimitMiddleware, limiter=http_limiter)
+
+REGISTRY.gauge(
+    "xp_rate_limit_rejected", "Запросы, отбитые rate limit (с запуска)"
+).set_function(lambda: http_limiter.rejected)
+REGISTRY.gauge(
+    "xp_claim_rate_limit_rejected", "Claim'ы, отбитые лимитом на юзера (с запуска)"
+).set_function(lambda: claim_limiter.rejected)
+
+
+# ----- Метрики HTTP (снаружи rate limit, чтобы 429 тоже считались) -----
+
+# отдельные серии только для известных путей — иначе метки разрастутся
+METRIC_PATHS = {"/xp/claim", "/xp/claim/batch", "/xp/claim/batch/stream", "/health"}
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"] if scope["path"] in METRIC_PATHS else "other"
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.labels(path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(path, status).inc()
+
+
+app.add_middleware(MetricsMiddleware)
 
 
 # ----- Модели запроса/ответа -----
 
+# предел |amount| одного начисления — и в /xp/claim, и в пачках
+XP_MAX_AMOUNT = int(os.getenv("XP_MAX_AMOUNT", "100000"))
+# userId / taskId / ключи — строки ограниченной длины (в журнале длина — u16)
+XP_MAX_ID_LENGTH = 256
+
+
 class XpClaimRequest(BaseModel):
-    userId: str
+    userId: str = Field(..., min_length=1, max_length=XP_MAX_ID_LENGTH)
     initData: str
-    taskId: Optional[str] = None
-    amount: Optional[int] = None
+    taskId: Optional[str] = Field(None, max_length=XP_MAX_ID_LENGTH)
+    amount: Optional[int] = Field(None, ge=-XP_MAX_AMOUNT, le=XP_MAX_AMOUNT)
+    idempotencyKey: Optional[str] = Field(None, max_length=XP_MAX_ID_LENGTH)
+
+
+class XpBatchRequest(BaseModel):
+    batchId: Optional[str] = Field(None, max_length=XP_MAX_ID_LENGTH)
+    # элементы проверяются по одному: кривой элемент не роняет всю пачку
+    items: List[Any]
+
+
+class LevelUpEvent(BaseModel):
+    fromLevel: int
+    toLevel: int
 
 
 class XpClaimResponse(BaseModel):
     ok: bool
     awardedXp: Optional[int] = None
     totalXp: Optional[int] = None
+    level: Optional[int] = None
+    currentXp: Optional[int] = None
+    nextLevelXp: Optional[int] = None
+    levelUp: Optional[LevelUpEvent] = None
+    taskType: Optional[str] = None
+    maxForUser: Optional[int] = None
     error: Optional[str] = None
 
 
-# ----- Временная "БД" в памяти (потом заменим на реальную) -----
+class LeaderboardEntry(BaseModel):
+    rank: int
+    userId: str
+    totalXp: int
+    level: int
 
-_fake_xp_db: Dict[str, int] = {}
 
+class LeaderboardResponse(BaseModel):
+    ok: bool
+    totalUsers: int
+    entries: List[LeaderboardEntry]
+
+
+class LeaderboardRankResponse(BaseModel):
+    ok: bool
+    totalUsers: int
+    entry: LeaderboardEntry
+
+
+# ----- Доступ к балансам -----
 
 def get_user_xp(user_id: str) -> int:
-    return _fake_xp_db.get(user_id, 0)
+    return xp_writes.projected(user_id)
 
 
 def set_user_xp(user_id: str, xp: int) -> None:
-    _fake_xp_db[user_id] = xp
+    xp_writes.discard(user_id)
+    xp_store.set(user_id, xp)
+    balance_changed(user_id, xp)
 
 
 # ----- Служебный healthcheck -----
 
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    return {
+        "ok": True,
+        "pid": os.getpid(),
+        "sharedState": SHARED_STATE,
+        "writeBehind": xp_writes.stats(),
+        "rateLimit": http_limiter.stats(),
+        "claimRateLimit": claim_limiter.stats(),
+        "completionCounters": len(completion_policy),
+        "stream": xp_updates.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 # ----- Основной эндпоинт XP -----
@@ -50,22 +591,534 @@ async def xp_claim(payload: XpClaimRequest) -> XpClaimResponse:
     task_id = payload.taskId or "unknown"
     amount = payload.amount
 
-    # TODO: позже добавим настоящую проверку подписи Telegram по initData
     if not init_data:
         raise HTTPException(status_code=400, detail="INIT_DATA_REQUIRED")
 
+    init_fields = init_data_verifier.verify(init_data)
+    if init_fields is None:
+        raise HTTPException(status_code=401, detail="INVALID_INIT_DATA")
+
+    # initData подписан для конкретного юзера — чужой userId не пускаем;
+    # initData без user не доказывает ничью личность
+    signed_user_id = init_data_user_id(init_fields)
+    if signed_user_id is None:
+        raise HTTPException(status_code=400, detail="USER_REQUIRED")
+    if signed_user_id != user_id:
+        raise HTTPException(status_code=403, detail="USER_MISMATCH")
+
+    # без явного ключа считаем повтором тот же initData для той же задачи;
+    # ключи всегда в пространстве конкретного юзера, а префикс claim:/batch:
+    # разводит их с ключами пачек (у тех ответ другой формы)
+    idempotency_key = payload.idempotencyKey or f"{task_id}:{init_fields['hash']}"
+    dedup_key = f"claim:{user_id}:{idempotency_key}"
+
+    # у нескольких воркеров лимит юзера, ключ и счётчик — одна транзакция
+    # общей базы; ошибка внутри откатывает всё сразу
+    with shared_transaction():
+        retry_after = claim_limiter.check(user_id)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="RATE_LIMITED",
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+
+        # ключ занимаем до начисления: повтор, пришедший в другой воркер
+        # посреди этого запроса, не начислит второй раз
+        reserved, replay = claim_dedup.reserve(dedup_key)
+        if replay is not None:
+            return replay
+        if not reserved:
+            raise HTTPException(status_code=409, detail="CLAIM_IN_PROGRESS")
+
+        # лимит выполнений (userId, taskId); повтор того же claim'а сюда не доходит
+        allowed, _, policy = completion_policy.try_acquire(user_id, task_id)
+        if not allowed:
+            claim_dedup.release(dedup_key)
+
+    if not allowed:
+        return XpClaimResponse(
+            ok=False,
+            totalXp=get_user_xp(user_id),
+            taskType=policy.task_type,
+            maxForUser=policy.max_completions,
+            error="LIMIT_REACHED",
+        )
+
     # Простое правило выдачи XP:
     # если amount передан — используем его, иначе даём фикс 100 XP
     base_award = amount if amount is not None else 100
 
-    current_xp = get_user_xp(user_id)
-    new_total_xp = current_xp + base_award
-    set_user_xp(user_id, new_total_xp)
+    try:
+        # сначала журнал: если запись не удалась, баланс ещё не тронут
+        seq = event_log.append(user_id, task_id, base_award)
+    except BaseException:
+        # начисления не было — выполнение не засчитываем
+        completion_policy.release(user_id, task_id)
+        claim_dedup.release(dedup_key)
+        raise
 
-    print(f"[XP] user={user_id} task={task_id} +{base_award}XP total={new_total_xp}")
+    # в хранилище уйдёт пачкой, клиенту сразу отдаём прогнозный баланс
+    try:
+        new_total_xp = xp_writes.add(user_id, base_award, _store_seq(seq))
+    except Exception:
+        # начисление уже в журнале, а дельта осталась в буфере и дойдёт до
+        # хранилища со следующим сбросом — claim состоялся, откатывать нечего;
+        # баланс — по журналу
+        log.exception("Store write failed, credit queued", extra={"userId": user_id})
+        new_total_xp = event_log.balances.get(user_id, 0)
+    balance_changed(user_id, new_total_xp)
 
-    return XpClaimResponse(
+    claims_log.info(
+        "claim",
+        extra={"userId": user_id, "taskId": task_id, "awardedXp": base_award, "totalXp": new_total_xp},
+    )
+
+    # уровень и прогресс считаем здесь, чтобы клиенту не нужен был запрос профиля
+    stats = level_stats(new_total_xp)
+    previous_level = level_stats(new_total_xp - base_award)["level"]
+    level_up = (
+        LevelUpEvent(fromLevel=previous_level, toLevel=stats["level"])
+        if stats["level"] != previous_level
+        else None
+    )
+
+    response = XpClaimResponse(
         ok=True,
         awardedXp=base_award,
         totalXp=new_total_xp,
-    )
\ No newline at end of file
+        level=stats["level"],
+        currentXp=stats["currentXp"],
+        nextLevelXp=stats["nextLevelXp"],
+        levelUp=level_up,
+    )
+    claim_dedup.put(dedup_key, response)
+
+    return response
+
+
+# ----- Пачка начислений от сервисов (/xp/claim/batch) -----
+
+# Bearer-токен сервисов; пусто — пачечные эндпоинты выключены
+XP_SERVICE_TOKEN = os.getenv("XP_SERVICE_TOKEN", "")
+XP_BATCH_MAX_ITEMS = int(os.getenv("XP_BATCH_MAX_ITEMS", "10000"))
+# NDJSON-вариант применяет поток кусками: один кусок — одна транзакция
+XP_BATCH_CHUNK = int(os.getenv("XP_BATCH_CHUNK", "1000"))
+XP_BATCH_MAX_LINE = 64 * 1024
+
+
+def require_service_token(authorization: Optional[str] = Header(None)) -> None:
+    if not XP_SERVICE_TOKEN:
+        raise HTTPException(status_code=403, detail="BATCH_DISABLED")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode(), XP_SERVICE_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=401, detail="INVALID_SERVICE_TOKEN")
+
+
+def _batch_item(raw) -> tuple[str, str, int, Optional[str]] | str:
+    """
+    (userId, taskId, amount, idempotencyKey) или код ошибки элемента.
+    """
+    if not isinstance(raw, dict):
+        return "INVALID_ITEM"
+    user_id = raw.get("userId")
+    task_id = raw.get("taskId") or "unknown"
+    amount = raw.get("amount")
+    key = raw.get("idempotencyKey")
+    if not isinstance(user_id, str) or not user_id or len(user_id) > XP_MAX_ID_LENGTH:
+        return "INVALID_USER_ID"
+    if not isinstance(task_id, str) or len(task_id) > XP_MAX_ID_LENGTH:
+        return "INVALID_TASK_ID"
+    if key is not None and (not isinstance(key, str) or len(key) > XP_MAX_ID_LENGTH):
+        return "INVALID_ITEM"
+    if amount is None:
+        # то же правило, что у /xp/claim
+        amount = 100
+    if not isinstance(amount, int) or isinstance(amount, bool) or abs(amount) > XP_MAX_AMOUNT:
+        return "INVALID_AMOUNT"
+    return user_id, task_id, amount, key
+
+
+def _claim_batch(raw_items: list, batch_id: Optional[str], counts: dict) -> list[list]:
+    """
+    Проверяет, дедуплицирует и применяет пачку одной транзакцией хранилища.
+
+    Результат по каждому элементу, в порядке запроса:
+    ["ok", totalXp, level] — начислено (totalXp — баланс сразу после элемента);
+    ["dup", totalXp, level] — повтор уже начисленного, ответ исходного начисления;
+    ["limit", maxForUser] — лимит выполнений задачи;
+    ["busy"] — тот же ключ сейчас начисляет другой запрос, повторить позже;
+    ["invalid", "КОД"] — элемент не прошёл проверку.
+    """
+    results: list = [None] * len(raw_items)
+    accepted: list[tuple[int, str, str, int, Optional[str]]] = []
+    first_index: dict[str, int] = {}
+    repeats: list[tuple[int, int]] = []
+    # все занятые ключи: при любой ошибке до журнала их надо отпустить,
+    # иначе повтор пачки получал бы ["busy"] до истечения ключа
+    reserved_keys: list[str] = []
+
+    def release_all() -> None:
+        for _, user_id, task_id, _, _ in accepted:
+            completion_policy.release(user_id, task_id)
+        for dedup_key in reserved_keys:
+            claim_dedup.release(dedup_key)
+
+    try:
+        # у нескольких воркеров вся проверка пачки — одна транзакция общей базы
+        with shared_transaction():
+            for i, raw in enumerate(raw_items):
+                item = _batch_item(raw)
+                if isinstance(item, str):
+                    results[i] = ["invalid", item]
+                    continue
+                user_id, task_id, amount, key = item
+
+                # ключ повтора: idempotencyKey, иначе batchId + taskId; без обоих
+                # повтором считается только тот же (userId, taskId) в этой же пачке
+                if key is None and batch_id:
+                    key = f"{batch_id}:{task_id}"
+                dedup_key = f"batch:{user_id}:{key}" if key is not None else None
+                local_key = dedup_key or f"{user_id}:{task_id}"
+
+                if local_key in first_index:
+                    repeats.append((i, first_index[local_key]))
+                    continue
+                if dedup_key is not None:
+                    reserved, replay = claim_dedup.reserve(dedup_key)
+                    if replay is not None:
+                        results[i] = ["dup", *replay[1:]]
+                        continue
+                    if not reserved:
+                        results[i] = ["busy"]
+                        continue
+                    reserved_keys.append(dedup_key)
+
+                allowed, _, policy = completion_policy.try_acquire(user_id, task_id)
+                if not allowed:
+                    if dedup_key is not None:
+                        claim_dedup.release(dedup_key)
+                    results[i] = ["limit", policy.max_completions]
+                    continue
+
+                first_index[local_key] = i
+                accepted.append((i, user_id, task_id, amount, dedup_key))
+    except BaseException:
+        # в общем режиме занятое уже вернул откат транзакции
+        if not SHARED_STATE:
+            release_all()
+        raise
+
+    # как в /xp/claim: журнал раньше хранилища
+    if accepted:
+        try:
+            seq = event_log.append_many(
+                [(user_id, task_id, amount) for _, user_id, task_id, amount, _ in accepted]
+            )
+        except BaseException:
+            release_all()
+            raise
+
+        deltas: dict[str, int] = {}
+        for _, user_id, _, amount, _ in accepted:
+            deltas[user_id] = deltas.get(user_id, 0) + amount
+
+        try:
+            totals = xp_writes.add_many(deltas, _store_seq(seq))
+        except Exception:
+            # как в /xp/claim: дельты остались в буфере, балансы — по журналу
+            log.exception("Store write failed, batch credit queued", extra={"users": len(deltas)})
+            totals = {user_id: event_log.balances.get(user_id, 0) for user_id in deltas}
+        for user_id, total_xp in totals.items():
+            balance_changed(user_id, total_xp)
+
+        # баланс после каждого элемента: от баланса до пачки по порядку
+        running = {user_id: totals[user_id] - delta for user_id, delta in deltas.items()}
+        for i, user_id, _, amount, dedup_key in accepted:
+            running[user_id] += amount
+            results[i] = ["ok", running[user_id], level_for(running[user_id])]
+            if dedup_key is not None:
+                claim_dedup.put(dedup_key, results[i])
+
+    for i, first in repeats:
+        results[i] = ["dup", *results[first][1:]]
+
+    counts["applied"] += len(accepted)
+    for result in results:
+        if result[0] != "ok":
+            counts[result[0]] += 1
+    return results
+
+
+def _batch_counts() -> dict:
+    return {"applied": 0, "dup": 0, "limit": 0, "busy": 0, "invalid": 0}
+
+
+def _log_batch(batch_id: Optional[str], counts: dict, started: float) -> None:
+    claims_log.info(
+        "claim batch",
+        extra={
+            "batchId": batch_id,
+            **counts,
+            "durationMs": round((time.perf_counter() - started) * 1000, 1),
+        },
+    )
+
+
+@app.post("/xp/claim/batch", dependencies=[Depends(require_service_token)])
+async def xp_claim_batch(payload: XpBatchRequest):
+    if len(payload.items) > XP_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail="BATCH_TOO_LARGE")
+
+    started = time.perf_counter()
+    counts = _batch_counts()
+    results = _claim_batch(payload.items, payload.batchId, counts)
+    _log_batch(payload.batchId, counts, started)
+
+    # без response_model: тысячи элементов не гоняем через валидацию pydantic
+    return JSONResponse({"ok": True, **counts, "results": results})
+
+
+def _read_spooled(spool):
+    try:
+        spool.seek(0)
+        while chunk := spool.read(64 * 1024):
+            yield chunk
+    finally:
+        spool.close()
+
+
+@app.post("/xp/claim/batch/stream", dependencies=[Depends(require_service_token)])
+async def xp_claim_batch_stream(
+    request: Request,
+    batchId: Optional[str] = Query(None, max_length=XP_MAX_ID_LENGTH),
+):
+    """
+    Тело — NDJSON, по элементу {userId, taskId, amount, idempotencyKey?} в строке.
+    Ответ — NDJSON: по строке результата на элемент (как в /xp/claim/batch),
+    последней — итоги. Запрос читается и применяется кусками по XP_BATCH_CHUNK,
+    результаты копятся во временном файле (до 1 МБ — в памяти) и отдаются потоком.
+    """
+    started = time.perf_counter()
+    counts = _batch_counts()
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    chunk: list = []
+    tail = b""
+    # строка длиннее XP_BATCH_MAX_LINE: уже помечена invalid, дочитываем до \n
+    skipping = False
+
+    def apply_chunk() -> None:
+        for result in _claim_batch(chunk, batchId, counts):
+            spool.write(json.dumps(result, ensure_ascii=False).encode() + b"\n")
+        chunk.clear()
+
+    def take_line(line: bytes) -> None:
+        if not line.strip():
+            return
+        try:
+            chunk.append(json.loads(line))
+        except ValueError:
+            chunk.append(None)
+        if len(chunk) >= XP_BATCH_CHUNK:
+            apply_chunk()
+
+    try:
+        async for data in request.stream():
+            lines = (tail + data).split(b"\n")
+            tail = lines.pop()
+            if skipping and lines:
+                lines.pop(0)
+                skipping = False
+            for line in lines:
+                take_line(line)
+            if len(tail) > XP_BATCH_MAX_LINE:
+                if not skipping:
+                    chunk.append(None)
+                skipping = True
+                tail = b""
+        if not skipping:
+            take_line(tail)
+        apply_chunk()
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.write(json.dumps({"ok": True, **counts}).encode() + b"\n")
+    _log_batch(batchId, counts, started)
+    return StreamingResponse(_read_spooled(spool), media_type="application/x-ndjson")
+
+
+# ----- Лидерборд -----
+
+def _with_levels(entries: list[dict]) -> list[dict]:
+    levels = levels_for(entry["totalXp"] for entry in entries)
+    for entry, level in zip(entries, levels):
+        entry["level"] = level
+    return entries
+
+
+@app.get("/xp/leaderboard/top", response_model=LeaderboardResponse)
+async def leaderboard_top(limit: int = Query(10, ge=1, le=100)) -> LeaderboardResponse:
+    return LeaderboardResponse(
+        ok=True,
+        totalUsers=len(leaderboard),
+        entries=_with_levels(leaderboard.top(limit)),
+    )
+
+
+@app.get("/xp/leaderboard/rank/{user_id}", response_model=LeaderboardRankResponse)
+async def leaderboard_rank(user_id: str) -> LeaderboardRankResponse:
+    entry = leaderboard.rank(user_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="USER_NOT_RANKED")
+
+    return LeaderboardRankResponse(
+        ok=True,
+        totalUsers=len(leaderboard),
+        entry=_with_levels([entry])[0],
+    )
+
+
+@app.get("/xp/leaderboard/around/{user_id}", response_model=LeaderboardResponse)
+async def leaderboard_around(
+    user_id: str,
+    radius: int = Query(5, ge=0, le=50),
+) -> LeaderboardResponse:
+    entries = leaderboard.around(user_id, radius)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="USER_NOT_RANKED")
+
+    return LeaderboardResponse(
+        ok=True,
+        totalUsers=len(leaderboard),
+        entries=_with_levels(entries),
+    )
+
+
+# ----- Лента и история начислений (NDJSON, потоком) -----
+
+def _xp_event(event: dict) -> dict:
+    # та же форма, что XpEvent в types/xp.ts, плюс userId и курсор seq
+    return {
+        "id": str(event["seq"]),
+        "type": "earn",
+        "amount": event["amount"],
+        "createdAt": datetime.fromtimestamp(event["ts"], timezone.utc).isoformat(),
+        "taskId": event["taskId"],
+        "userId": event["userId"],
+        "seq": event["seq"],
+    }
+
+
+def _stream_events(since: int, limit: int):
+    for i, event in enumerate(event_log.iter_events(since_seq=since)):
+        if i >= limit:
+            break
+        yield json.dumps(_xp_event(event), ensure_ascii=False) + "\n"
+
+
+@app.get("/xp/events/feed", dependencies=[Depends(require_service_token)])
+async def xp_events_feed(
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    """
+    Лента всех начислений (userId, taskId, amount) — только для сервисов.
+    """
+    return StreamingResponse(
+        _stream_events(since, limit),
+        media_type="application/x-ndjson",
+    )
+
+
+# сколько записей журнала просматривает один запрос истории
+XP_HISTORY_MAX_SCAN = int(os.getenv("XP_HISTORY_MAX_SCAN", "50000"))
+
+
+def require_history_access(
+    user_id: str,
+    authorization: Optional[str] = Header(None),
+    x_telegram_init_data: Optional[str] = Header(None),
+) -> None:
+    """
+    Историю читает сам юзер (initData в заголовке X-Telegram-Init-Data)
+    или сервис с XP_SERVICE_TOKEN.
+    """
+    if x_telegram_init_data:
+        init_fields = init_data_verifier.verify(x_telegram_init_data)
+        if init_fields is None:
+            raise HTTPException(status_code=401, detail="INVALID_INIT_DATA")
+        if init_data_user_id(init_fields) != user_id:
+            raise HTTPException(status_code=403, detail="USER_MISMATCH")
+        return
+    if not authorization:
+        raise HTTPException(status_code=401, detail="INIT_DATA_REQUIRED")
+    require_service_token(authorization)
+
+
+@app.get("/xp/events/history/{user_id}", dependencies=[Depends(require_history_access)])
+async def xp_events_history(
+    user_id: str,
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    """
+    За один запрос просматривается не больше XP_HISTORY_MAX_SCAN записей.
+    Заголовок X-Next-Since — since для продолжения (нет его — история
+    дочитана); страница может быть и пустой, если в просмотренном
+    куске событий юзера не было.
+    """
+    events, next_since = await asyncio.to_thread(
+        event_log.user_history, user_id, since, limit, XP_HISTORY_MAX_SCAN
+    )
+    headers = {"X-Next-Since": str(next_since)} if next_since is not None else None
+    return StreamingResponse(
+        (json.dumps(_xp_event(event), ensure_ascii=False) + "\n" for event in events),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+
+# ----- Поток обновлений баланса (SSE) -----
+
+async def _xp_stream(user_id: str):
+    sub = xp_updates.subscribe(user_id)
+    try:
+        # первым — текущий баланс: после переподключения ничего не пропущено
+        yield b"retry: 5000\n" + _xp_update_frame(user_id, get_user_xp(user_id))
+        while True:
+            message = await sub.get()
+            if message is None:
+                # отстал и был отключён или воркер останавливается
+                return
+            yield message
+    finally:
+        xp_updates.unsubscribe(sub)
+
+
+@app.get("/xp/stream")
+async def xp_stream(initData: str = Query(...)):
+    """
+    Server-Sent Events: totalXp и уровень пользователя при каждом изменении.
+    EventSource не умеет заголовки, поэтому initData — в query.
+    """
+    init_fields = init_data_verifier.verify(initData)
+    if init_fields is None:
+        raise HTTPException(status_code=401, detail="INVALID_INIT_DATA")
+
+    user_id = init_data_user_id(init_fields)
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="USER_REQUIRED")
+
+    if xp_updates.is_full():
+        raise HTTPException(status_code=503, detail="TOO_MANY_SUBSCRIBERS")
+
+    return StreamingResponse(
+        _xp_stream(user_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx не копит поток у себя
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,119 @@
+"""
+Постраничный вывод длинных списков в боте (/tasks, /pending).
+
+Telegram не принимает сообщения длиннее 4096 символов, поэтому страница
+ограничена сразу двумя способами: не больше max_items элементов
+и не больше max_chars символов текста.
+
+PendingPages хранит для каждого админа цепочку keyset-курсоров
+(курсор i-й страницы = позиция после последней заявки (i-1)-й)
+и закэшированные страницы: "назад" отдаётся из кэша,
+"вперёд" — один запрос к API ровно за одной страницей.
+"""
+import time
+from typing import Awaitable, Callable, Optional
+
+MESSAGE_LIMIT = 4096
+
+
+class PageLoadError(Exception):
+    """API вернул ошибку вместо страницы."""
+
+
+def clip(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[: max(0, limit - 1)] + "…"
+
+
+def split_pages(blocks: list[str], max_items: int, max_chars: int) -> list[list[str]]:
+    """
+    Раскладывает готовые блоки текста по страницам, не разрывая блоки.
+    Блок длиннее max_chars обрезается, чтобы страница всё равно влезла.
+    """
+    pages: list[list[str]] = []
+    current: list[str] = []
+    size = 0
+    for block in blocks:
+        block = clip(block, max_chars)
+        cost = len(block) + 1  # + перевод строки
+        if current and (len(current) >= max_items or size + cost > max_chars):
+            pages.append(current)
+            current, size = [], 0
+        current.append(block)
+        size += cost
+    if current:
+        pages.append(current)
+    return pages
+
+
+class _Session:
+    __slots__ = ("cursors", "pages")
+
+    def __init__(self):
+        # cursors[i] — курсор для загрузки страницы i; None у первой
+        self.cursors: list[Optional[str]] = [None]
+        # номер страницы -> (истекает, заявки, есть ли следующая)
+        self.pages: dict[int, tuple[float, list[dict], bool]] = {}
+
+
+class PendingPages:
+    def __init__(
+        self,
+        fetch: Callable[[Optional[str], int], Awaitable[tuple[list[dict], Optional[str]]]],
+        page_size: int = 10,
+        ttl: float = 30.0,
+    ):
+        """
+        fetch(cursor, limit) -> (заявки, курсор следующей страницы или None).
+        """
+        self._fetch = fetch
+        self.page_size = page_size
+        self._ttl = ttl
+        self._sessions: dict[int, _Session] = {}
+
+    def reset(self, owner: int) -> None:
+        """
+        Новый /pending: листаем с начала, старые курсоры не нужны.
+        """
+        self._sessions[owner] = _Session()
+
+    def invalidate(self) -> None:
+        """
+        Очередь изменилась (approve/reject): кэш страниц сбрасываем,
+        а keyset-курсоры остаются валидными — от них просто перечитаем.
+        """
+        for session in self._sessions.values():
+            session.pages.clear()
+
+    def known_pages(self, owner: int) -> int:
+        session = self._sessions.get(owner)
+        return len(session.cursors) if session else 0
+
+    async def page(self, owner: int, number: int) -> Optional[tuple[list[dict], bool]]:
+        """
+        (заявки страницы, есть ли следующая) или None, если до этой
+        страницы ещё не долистали (курсора для неё нет).
+        """
+        session = self._sessions.get(owner)
+        if session is None:
+            session = self._sessions[owner] = _Session()
+        if not 0 <= number < len(session.cursors):
+            return None
+
+        cached = session.pages.get(number)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1], cached[2]
+
+        items, next_cursor = await self._fetch(session.cursors[number], self.page_size)
+        has_next = next_cursor is not None
+
+        # следующая страница теперь считается от свежего курсора
+        del session.cursors[number + 1:]
+        if has_next:
+            session.cursors.append(next_cursor)
+        for stale in [n for n in session.pages if n > number]:
+            del session.pages[stale]
+
+        session.pages[number] = (time.monotonic() + self._ttl, items, has_next)
+        return items, has_next
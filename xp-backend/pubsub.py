@@ -0,0 +1,140 @@
+"""
+Pub/sub внутри процесса для push-обновлений (SSE в main.py).
+
+Ключ подписки — пользователь; у одного пользователя может быть несколько
+подписок (вкладки, устройства). У каждой подписки своя очередь на queue_size
+сообщений: publish() никогда не ждёт — если клиент не успевает забирать
+сообщения, его подписка закрывается, а EventSource сам переподключится
+и получит актуальный баланс первым сообщением.
+
+На десятки тысяч простаивающих соединений: подписка — объект со __slots__
+и маленьким deque, future создаётся только на время ожидания, своих
+таймеров у подписок нет — keep-alive рассылает heartbeat() разом всем.
+"""
+import asyncio
+from collections import deque
+from typing import Hashable, Optional
+
+
+class Subscription:
+    __slots__ = ("key", "closed", "_queue", "_maxsize", "_waiter")
+
+    def __init__(self, key: Hashable, maxsize: int):
+        self.key = key
+        self.closed = False
+        self._queue: deque[bytes] = deque()
+        self._maxsize = maxsize
+        self._waiter: Optional[asyncio.Future] = None
+
+    def _push(self, message: bytes) -> bool:
+        if len(self._queue) >= self._maxsize:
+            return False
+        self._queue.append(message)
+        self._wake()
+        return True
+
+    def _wake(self) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _close(self) -> None:
+        self.closed = True
+        self._queue.clear()
+        self._wake()
+
+    async def get(self) -> Optional[bytes]:
+        """
+        Следующее сообщение; None — подписку закрыли (медленный клиент или остановка).
+        """
+        while not self._queue:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._queue.popleft()
+
+
+class Broker:
+    def __init__(self, queue_size: int = 16, max_subscribers: int = 50_000):
+        self._queue_size = queue_size
+        self._max_subscribers = max_subscribers
+        self._subs: dict[Hashable, set[Subscription]] = {}
+        self._count = 0
+        self._closed = False
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def is_full(self) -> bool:
+        return self._count >= self._max_subscribers
+
+    def has_subscribers(self, key: Hashable) -> bool:
+        return key in self._subs
+
+    def subscribe(self, key: Hashable) -> Subscription:
+        sub = Subscription(key, self._queue_size)
+        if self._closed:
+            # остановка уже началась — поток сразу закончится
+            sub._close()
+            return sub
+        self._subs.setdefault(key, set()).add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subs.get(sub.key)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[sub.key]
+        self._count -= 1
+        sub._close()
+
+    def _deliver(self, subs, message: bytes) -> None:
+        for sub in list(subs):
+            if sub._push(message):
+                self.delivered += 1
+            else:
+                # очередь полна — клиент не читает; отключаем, а не ждём его
+                self.dropped += 1
+                self.unsubscribe(sub)
+
+    def publish(self, key: Hashable, message: bytes) -> None:
+        subs = self._subs.get(key)
+        if subs:
+            self.published += 1
+            self._deliver(subs, message)
+
+    def heartbeat(self, message: bytes) -> None:
+        """
+        Keep-alive всем подпискам; заодно отсеивает тех, кто перестал читать.
+        """
+        for subs in list(self._subs.values()):
+            self._deliver(subs, message)
+
+    def close(self) -> None:
+        """
+        Закрывает все подписки и не принимает новые.
+        """
+        self._closed = True
+        for subs in list(self._subs.values()):
+            for sub in list(subs):
+                self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self._count,
+            "users": len(self._subs),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
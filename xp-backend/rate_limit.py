@@ -0,0 +1,121 @@
+"""
+Token bucket лимитер: общий бакет на весь процесс + бакет на пользователя.
+
+Бакеты пользователей лежат в OrderedDict в порядке последнего обращения:
+простаивающие (и, значит, уже полностью наполненные) вытесняются с начала,
+поэтому память ограничена max_users, а проверка — O(1).
+Сам лимитер не знает про FastAPI и aiogram; middleware для них живут рядом
+с приложениями (main.py и bot.py).
+"""
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def has_token(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= 1
+
+    def consume(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        *,
+        user_rate: float,
+        user_burst: float,
+        global_rate: float | None,
+        global_burst: float = 0.0,
+        max_users: int = 50_000,
+        idle_ttl: float = 600.0,
+    ):
+        self._user_rate = user_rate
+        self._user_burst = user_burst
+        self._max_users = max_users
+        self._idle_ttl = idle_ttl
+
+        # global_rate=None — без общего бакета (лимит только по ключам)
+        self._global = (
+            TokenBucket(global_rate, global_burst, time.monotonic())
+            if global_rate is not None
+            else None
+        )
+        self._users: OrderedDict[str, TokenBucket] = OrderedDict()
+
+        self.allowed = 0
+        self.rejected = 0
+
+    def _user_bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self._users.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self._user_rate, self._user_burst, now)
+            self._users[key] = bucket
+        else:
+            self._users.move_to_end(key)
+        self._evict(now)
+        return bucket
+
+    def _evict(self, now: float) -> None:
+        users = self._users
+        while users:
+            oldest = next(iter(users.values()))
+            if len(users) <= self._max_users and now - oldest.updated_at < self._idle_ttl:
+                break
+            users.popitem(last=False)
+
+    def check(self, user_key: str | None) -> float:
+        """
+        Пытается списать токен. Возвращает 0, если запрос пропущен,
+        иначе — через сколько секунд стоит повторить.
+        """
+        now = time.monotonic()
+
+        user_bucket = self._user_bucket(user_key, now) if user_key is not None else None
+
+        # сначала проверяем оба бакета, списываем только если пропускают оба —
+        # иначе отказ по глобальному лимиту съедал бы токены юзера
+        if user_bucket is not None and not user_bucket.has_token(now):
+            self.rejected += 1
+            return max(user_bucket.retry_after(), 0.001)
+
+        if self._global is not None and not self._global.consume(now):
+            self.rejected += 1
+            return max(self._global.retry_after(), 0.001)
+
+        if user_bucket is not None:
+            user_bucket.consume(now)
+
+        self.allowed += 1
+        return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "trackedUsers": len(self._users),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,195 @@
+"""
+Планировщик исходящих сообщений Telegram.
+
+Через него идут все запросы бота, у которых есть chat_id (см. bot.py).
+Telegram ограничивает:
+- частоту в один чат (≈1 сообщение в секунду, в группах ≈20 в минуту),
+  короткие всплески допустимы;
+- общую частоту бота (≈30 сообщений в секунду на все чаты);
+- при превышении отвечает flood-wait (RetryAfter) с временем ожидания.
+
+Для каждого чата — token bucket с небольшим запасом и очередь
+(asyncio.Lock — FIFO): сообщения в один чат уходят по порядку, разные
+чаты — параллельно. Перед самой отправкой запрос ждёт токен общего бакета;
+ожидающие обслуживаются по приоритету (ответы админам, затем пользователям, затем рассылки),
+внутри приоритета — по очереди прихода. На flood-wait чат замораживается
+ровно на столько, сколько попросил Telegram, и запрос повторяется.
+
+Сам модуль не знает про aiogram: вызов отправки — любая корутина,
+а время ожидания из исключения достаёт переданная функция retry_after.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from rate_limit import TokenBucket
+
+T = TypeVar("T")
+
+# приоритеты: меньше — раньше
+PRIORITY_ADMIN = 0  # ответы админам
+PRIORITY_USER = 1  # ответы пользователям
+PRIORITY_BULK = 2  # рассылки и дайджесты
+
+
+class _ChatSlot:
+    __slots__ = ("lock", "bucket", "blocked_until")
+
+    def __init__(self, bucket: TokenBucket):
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        # до этого момента чат заморожен flood-wait'ом
+        self.blocked_until = 0.0
+
+    def idle(self, now: float) -> bool:
+        return (
+            not self.lock.locked()
+            and self.blocked_until <= now
+            and self.bucket.has_token(now)
+            and self.bucket.tokens >= self.bucket.capacity
+        )
+
+
+class SendScheduler:
+    def __init__(
+        self,
+        *,
+        retry_after: Callable[[BaseException], Optional[float]],
+        global_rate: float = 30.0,
+        global_burst: float = 30.0,
+        per_chat_interval: float = 1.0,
+        per_chat_burst: float = 3.0,
+        group_interval: float = 3.0,
+        max_retries: int = 3,
+        max_chats: int = 10_000,
+    ):
+        self._retry_after = retry_after
+        self._per_chat_interval = per_chat_interval
+        self._per_chat_burst = per_chat_burst
+        self._group_interval = group_interval
+        self._max_retries = max_retries
+        self._max_chats = max_chats
+        self._chats: OrderedDict[int, _ChatSlot] = OrderedDict()
+
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        # (приоритет, порядковый номер, future) — ждущие токен общего бакета
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._gate: asyncio.Task | None = None
+
+        self.sent = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.throttled = 0
+
+    # -----------------------------------------------------------------
+    # Лимит на чат
+    # -----------------------------------------------------------------
+    def _slot(self, chat_id: int) -> _ChatSlot:
+        slot = self._chats.get(chat_id)
+        if slot is None:
+            # отрицательный chat_id — группы и каналы, у них лимит строже
+            interval = self._group_interval if chat_id < 0 else self._per_chat_interval
+            rate = 1.0 / interval if interval > 0 else float("inf")
+            bucket = TokenBucket(rate, self._per_chat_burst, time.monotonic())
+            slot = self._chats[chat_id] = _ChatSlot(bucket)
+        else:
+            self._chats.move_to_end(chat_id)
+        self._evict()
+        return slot
+
+    def _evict(self) -> None:
+        # вытесняем только свободные чаты с полным бакетом — их состояние
+        # совпадает с только что созданным
+        now = time.monotonic()
+        while len(self._chats) > self._max_chats:
+            chat_id, slot = next(iter(self._chats.items()))
+            if not slot.idle(now):
+                break
+            self._chats.popitem(last=False)
+
+    async def _chat_turn(self, slot: _ChatSlot) -> None:
+        while True:
+            now = time.monotonic()
+            delay = slot.blocked_until - now
+            if delay <= 0:
+                if slot.bucket.consume(now):
+                    return
+                delay = slot.bucket.retry_after()
+            await asyncio.sleep(delay)
+
+    # -----------------------------------------------------------------
+    # Общий лимит с приоритетами
+    # -----------------------------------------------------------------
+    async def _global_turn(self, priority: int) -> None:
+        # без очереди — сразу, иначе не обгоняем тех, кто уже ждёт
+        if not self._waiters and self._global.consume(time.monotonic()):
+            return
+
+        self.throttled += 1
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._gate is None or self._gate.done():
+            self._gate = asyncio.create_task(self._run_gate())
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # токен уже выдан, а отправки не будет — возвращаем
+                self._global.tokens = min(self._global.capacity, self._global.tokens + 1)
+            raise
+
+    async def _run_gate(self) -> None:
+        waiters = self._waiters
+        while waiters:
+            if waiters[0][2].done():
+                # ожидающего отменили
+                heapq.heappop(waiters)
+                continue
+            if self._global.consume(time.monotonic()):
+                heapq.heappop(waiters)[2].set_result(None)
+                continue
+            await asyncio.sleep(self._global.retry_after())
+
+    # -----------------------------------------------------------------
+    # Отправка
+    # -----------------------------------------------------------------
+    async def send(
+        self, chat_id: int, call: Callable[[], Awaitable[T]], priority: int = PRIORITY_USER
+    ) -> T:
+        slot = self._slot(chat_id)
+        async with slot.lock:
+            attempt = 0
+            while True:
+                await self._chat_turn(slot)
+                await self._global_turn(priority)
+                try:
+                    result = await call()
+                except Exception as e:
+                    wait = self._retry_after(e)
+                    if wait is None or attempt >= self._max_retries:
+                        self.failed += 1
+                        raise
+                    attempt += 1
+                    self.flood_waits += 1
+                    slot.blocked_until = time.monotonic() + wait
+                    continue
+
+                self.sent += 1
+                return result
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        return {
+            "trackedChats": len(self._chats),
+            "waiting": len(self._waiters),
+            "sent": self.sent,
+            "failed": self.failed,
+            "floodWaits": self.flood_waits,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,61 @@
+"""
+Запуск XP-сервиса на всех ядрах.
+
+    XP_WORKERS=8 python serve.py        # по умолчанию — по числу CPU
+    XP_WORKERS=1 python serve.py        # один процесс, всё состояние в памяти
+
+Несколько воркеров uvicorn слушают один порт; чтобы балансы и лимиты
+не разъезжались по процессам, включается XP_SHARED_STATE=1:
+- балансы — в SQLite (XP_DB_PATH) без write-behind, начисление — атомарный UPSERT;
+- идемпотентность, rate limit и счётчики выполнений задач — в XP_SHARED_DB_PATH;
+- журнал начислений (XP_EVENT_LOG_DIR) пишется всеми воркерами под flock,
+  по нему же каждый воркер подтягивает в свой лидерборд чужие начисления.
+Все файлы должны лежать на локальном диске одной машины (не NFS).
+Хвост журнала в базу при старте здесь не доигрывается (это делает только
+одиночный процесс): начисление воркера, упавшего ровно между записью
+в журнал и UPSERT в базу, останется только в журнале.
+Метрики /metrics и /health — по тому воркеру, который ответил на запрос.
+
+Подписчики /xp/stream держат соединение с одним воркером; начисления,
+сделанные другими воркерами, доходят до них через общий журнал.
+
+Настройки: HOST (0.0.0.0), PORT (8000), XP_WORKERS, XP_SHUTDOWN_TIMEOUT,
+FORWARDED_ALLOW_IPS (адреса прокси через запятую, по умолчанию 127.0.0.1),
+остальное — как у main.py.
+"""
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+def main() -> None:
+    load_dotenv()
+
+    workers = int(os.getenv("XP_WORKERS") or os.cpu_count() or 1)
+    # воркеры делят между собой XP_RATE_GLOBAL (см. SharedRateLimiter)
+    os.environ["XP_WORKERS"] = str(workers)
+    if workers > 1:
+        # окружение наследуют процессы воркеров
+        os.environ["XP_SHARED_STATE"] = "1"
+        if os.getenv("XP_STORE", "sqlite").lower() != "sqlite":
+            raise RuntimeError("Несколько воркеров работают только с XP_STORE=sqlite.")
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        proxy_headers=True,
+        # X-Forwarded-For принимаем только от своего прокси: иначе клиент
+        # подставит любой адрес и обойдёт лимит по IP
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        # SSE-потоки (/xp/stream) сами не заканчиваются — не ждём их дольше этого
+        timeout_graceful_shutdown=int(os.getenv("XP_SHUTDOWN_TIMEOUT", "10")),
+        # логи uvicorn идут через наш JSON-логгер (setup_logging в main.py)
+        log_config=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
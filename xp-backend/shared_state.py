@@ -0,0 +1,358 @@
+"""
+Общее состояние воркеров main.py на одной машине (см. serve.py).
+
+Всё, что в однопроцессном режиме живёт в памяти процесса — индекс
+идемпотентности, бакеты rate limit, счётчики выполнений задач, —
+здесь лежит в отдельном файле SQLite в режиме WAL. Каждая проверка —
+один оператор UPSERT ... RETURNING, поэтому атомарна между процессами
+без явных транзакций и блокировок на стороне Python.
+
+Интерфейсы совпадают с DedupIndex, RateLimiter и CompletionPolicy,
+так что main.py выбирает реализацию одной строкой. Несколько проверок
+одного запроса main.py объединяет в transaction(): одна блокировка
+записи на всё вместо отдельной на каждый UPSERT.
+Время — time.time(): monotonic у каждого процесса своё.
+"""
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from completion_policy import COUNT_BITS, COUNT_MASK, CompletionPolicy, TaskPolicy
+from rate_limit import TokenBucket
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS claim_dedup (
+    key        TEXT PRIMARY KEY,
+    response   TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS claim_dedup_expires ON claim_dedup (expires_at);
+
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key        TEXT PRIMARY KEY,
+    tokens     REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rate_buckets_updated ON rate_buckets (updated_at);
+
+CREATE TABLE IF NOT EXISTS completion_counters (
+    user_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    packed  INTEGER NOT NULL,
+    PRIMARY KEY (user_id, task_id)
+) WITHOUT ROWID;
+"""
+
+# протухшие записи чистим не на каждом запросе, а раз в столько операций
+_SWEEP_EVERY = 1000
+
+
+class SharedState:
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        # одно соединение на процесс: пользуется им только event loop
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self.conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Операторы внутри — одна транзакция записи (BEGIN IMMEDIATE: блокировку
+        берём сразу, а не при первом UPDATE). Вложенный вызов — в ту же.
+        """
+        if self.conn.in_transaction:
+            yield
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple | dict = ()) -> list[tuple]:
+        # fetchall: оператор должен дойти до конца и закрыть неявную транзакцию
+        return self.conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# ---------------------------------------------------------------------
+# Идемпотентность /xp/claim
+# ---------------------------------------------------------------------
+# занять ключ, если его нет или он протух; иначе строка не вернётся.
+# response = '' — ключ занят, ответа ещё нет
+_RESERVE_SQL = """
+INSERT INTO claim_dedup (key, response, expires_at) VALUES (:key, '', :until)
+ON CONFLICT (key) DO UPDATE SET response = '', expires_at = :until
+WHERE claim_dedup.expires_at <= :now
+RETURNING 1
+"""
+
+
+class SharedDedupIndex:
+    def __init__(
+        self,
+        state: SharedState,
+        ttl: float = 600.0,
+        encode: Callable[[Any], Any] = lambda value: value,
+        pending_ttl: float = 30.0,
+    ):
+        """
+        encode превращает ответ в JSON-совместимое значение;
+        get() и reserve() отдают его уже разобранным (dict).
+        pending_ttl — сколько держится занятый ключ без ответа
+        (если воркер упал посреди запроса).
+        """
+        self._state = state
+        self._ttl = ttl
+        self._encode = encode
+        self._pending_ttl = pending_ttl
+        self._ops = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._state.query("SELECT count(*) FROM claim_dedup")[0][0]
+
+    def _sweep(self, now: float) -> None:
+        self._ops += 1
+        if self._ops % _SWEEP_EVERY == 0:
+            self._state.query("DELETE FROM claim_dedup WHERE expires_at <= ?", (now,))
+
+    def get(self, key: str) -> Any | None:
+        now = time.time()
+        self._sweep(now)
+        rows = self._state.query(
+            "SELECT response FROM claim_dedup WHERE key = ? AND expires_at > ?", (key, now)
+        )
+        if not rows or not rows[0][0]:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(rows[0][0])
+
+    def reserve(self, key: str) -> tuple[bool, Any | None]:
+        """
+        Как DedupIndex.reserve, но атомарно между процессами: из двух
+        воркеров с одним и тем же повтором ключ займёт только один.
+        """
+        now = time.time()
+        self._sweep(now)
+        params = {"key": key, "until": now + self._pending_ttl, "now": now}
+        if self._state.query(_RESERVE_SQL, params):
+            self.misses += 1
+            return True, None
+
+        rows = self._state.query("SELECT response FROM claim_dedup WHERE key = ?", (key,))
+        if not rows or not rows[0][0]:
+            # занят другим воркером (или только что освобождён)
+            return False, None
+        self.hits += 1
+        return False, json.loads(rows[0][0])
+
+    def release(self, key: str) -> None:
+        self._state.query("DELETE FROM claim_dedup WHERE key = ? AND response = ''", (key,))
+
+    def put(self, key: str, value: Any) -> None:
+        self._state.query(
+            "INSERT INTO claim_dedup (key, response, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "response = excluded.response, expires_at = excluded.expires_at",
+            (key, json.dumps(self._encode(value), ensure_ascii=False), time.time() + self._ttl),
+        )
+
+
+# ---------------------------------------------------------------------
+# Rate limit
+# ---------------------------------------------------------------------
+# списать токен, если после пополнения он есть; иначе строка не вернётся
+_TAKE_TOKEN_SQL = """
+INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (:key, :burst - 1, :now)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:burst, tokens + max(0, :now - updated_at) * :rate) - 1,
+    updated_at = :now
+WHERE min(:burst, tokens + max(0, :now - updated_at) * :rate) >= 1
+RETURNING tokens
+"""
+
+class SharedRateLimiter:
+    def __init__(
+        self,
+        state: SharedState,
+        *,
+        scope: str,
+        user_rate: float,
+        user_burst: float,
+        global_rate: float | None,
+        global_burst: float = 0.0,
+        idle_ttl: float = 600.0,
+        workers: int = 1,
+    ):
+        """
+        Бакеты клиентов — в базе. Общий бакет делится между воркерами
+        поровну и живёт в памяти процесса: одна строка на весь сервис
+        сериализовала бы запросы всех воркеров на её блокировке.
+
+        Таблица бакетов одна на все лимитеры: ключи лимитера начинаются
+        с `scope:`, и чистка со статистикой трогают только свои строки.
+        """
+        self._state = state
+        self._prefix = f"{scope}:"
+        # ключи со `scope:` лежат в полуинтервале [scope:, scope;) — по индексу ключа
+        self._scope = {"lo": f"{scope}:", "hi": f"{scope};"}
+        self._user = (user_rate, user_burst)
+        self._global = (
+            TokenBucket(global_rate / workers, global_burst / workers, time.time())
+            if global_rate is not None
+            else None
+        )
+        self._idle_ttl = idle_ttl
+        self._ops = 0
+
+        self.allowed = 0
+        self.rejected = 0
+
+    def _take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """
+        0, если токен списан, иначе — через сколько секунд он появится.
+        """
+        params = {"key": key, "rate": rate, "burst": burst, "now": now}
+        if self._state.query(_TAKE_TOKEN_SQL, params):
+            return 0.0
+        ((tokens, updated_at),) = self._state.query(
+            "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+        )
+        tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+        return max((1 - tokens) / rate if rate > 0 else 1.0, 0.001)
+
+    def check(self, user_key: str | None) -> float:
+        """
+        Как RateLimiter.check: 0 — пропущен, иначе retry_after в секундах.
+        """
+        now = time.time()
+        self._ops += 1
+        if self._ops % _SWEEP_EVERY == 0:
+            self._state.query(
+                "DELETE FROM rate_buckets"
+                " WHERE key >= :lo AND key < :hi AND updated_at < :before",
+                {**self._scope, "before": now - self._idle_ttl},
+            )
+
+        # общий бакет в памяти: сначала только смотрим, списываем последним —
+        # отказ по нему не съедает токен клиента, и наоборот
+        if self._global is not None and not self._global.has_token(now):
+            self.rejected += 1
+            return max(self._global.retry_after(), 0.001)
+
+        if user_key is not None:
+            retry_after = self._take(self._prefix + user_key, *self._user, now)
+            if retry_after:
+                self.rejected += 1
+                return retry_after
+
+        if self._global is not None:
+            self._global.consume(now)
+        self.allowed += 1
+        return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "trackedUsers": self._state.query(
+                "SELECT count(*) FROM rate_buckets WHERE key >= :lo AND key < :hi", self._scope
+            )[0][0],
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+# ---------------------------------------------------------------------
+# Лимиты выполнений задач
+# ---------------------------------------------------------------------
+# та же упаковка `день << 32 | счётчик`, что в CompletionPolicy;
+# при исчерпанном лимите WHERE не пропускает UPDATE и строка не вернётся
+_ACQUIRE_SQL = f"""
+INSERT INTO completion_counters (user_id, task_id, packed) VALUES (:user, :task, :first)
+ON CONFLICT (user_id, task_id) DO UPDATE SET
+    packed = CASE WHEN packed >> {COUNT_BITS} = :day THEN packed + 1 ELSE :first END
+WHERE :max IS NULL
+   OR packed >> {COUNT_BITS} != :day
+   OR (packed & {COUNT_MASK}) < :max
+RETURNING packed
+"""
+
+
+class SharedCompletionPolicy(CompletionPolicy):
+    def __init__(
+        self,
+        state: SharedState,
+        policies: Optional[dict[str, TaskPolicy]] = None,
+        default: TaskPolicy = TaskPolicy("multi", None),
+        day_offset_hours: float = 0.0,
+    ):
+        super().__init__(policies, default, day_offset_hours)
+        self._state = state
+
+    def __len__(self) -> int:
+        return self._state.query("SELECT count(*) FROM completion_counters")[0][0]
+
+    def try_acquire(
+        self, user_id: str, task_id: str, now: Optional[float] = None
+    ) -> tuple[bool, int, TaskPolicy]:
+        policy = self.policy(task_id)
+        if policy.max_completions is None:
+            return True, 0, policy
+        day = self._day(now) if policy.task_type == "daily" else 0
+        rows = self._state.query(
+            _ACQUIRE_SQL,
+            {
+                "user": user_id,
+                "task": task_id,
+                "day": day,
+                "first": day << COUNT_BITS | 1,
+                "max": policy.max_completions,
+            },
+        )
+        if not rows:
+            return False, policy.max_completions, policy
+        return True, rows[0][0] & COUNT_MASK, policy
+
+    def release(self, user_id: str, task_id: str, now: Optional[float] = None) -> None:
+        policy = self.policy(task_id)
+        if policy.max_completions is None:
+            return
+        day = self._day(now) if policy.task_type == "daily" else 0
+        self._state.query(
+            f"UPDATE completion_counters SET packed = packed - 1 "
+            f"WHERE user_id = ? AND task_id = ? "
+            f"AND packed >> {COUNT_BITS} = ? AND (packed & {COUNT_MASK}) > 0",
+            (user_id, task_id, day),
+        )
+
+    def prune(self, now: Optional[float] = None) -> int:
+        # день в счётчике пишут только daily; 0 — у остальных типов
+        rows = self._state.query(
+            f"DELETE FROM completion_counters WHERE packed >> {COUNT_BITS} NOT IN (0, ?) RETURNING 1",
+            (self._day(now),),
+        )
+        return len(rows)
+
+    def load(self, events) -> None:
+        # счётчики уже лежат в базе и переживают перезапуск
+        pass
+
+    def dump(self) -> None:
+        # в снапшот не нужны; вызывается вместе с ним — тут и чистим
+        self.prune()
+        return None
+
+    def restore(self, counters: list) -> None:
+        pass
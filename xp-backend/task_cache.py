@@ -0,0 +1,79 @@
+"""
+Кэш каталога задач для /tasks.
+
+Каталог меняется только через /newtask и /deletetask, поэтому держим его
+в памяти с TTL, а админские мутации сбрасывают кэш явно.
+Параллельные промахи склеиваются в один запрос к API,
+готовый текст (или страницы) сообщения мемоизируется до следующей смены каталога.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class TaskCatalogueError(Exception):
+    """API вернул ошибку вместо списка задач."""
+
+
+class TaskCatalogueCache:
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[list[dict]]],
+        ttl: float = 60.0,
+    ):
+        self._loader = loader
+        self._ttl = ttl
+
+        self._tasks: list[dict] | None = None
+        self._expires_at = 0.0
+        # растёт при каждой загрузке/инвалидации — ключ для мемоизации текста
+        self._version = 0
+        self._inflight: asyncio.Future | None = None
+
+        self._rendered_version = -1
+        self._rendered = None
+
+    def is_fresh(self) -> bool:
+        return self._tasks is not None and time.monotonic() < self._expires_at
+
+    def invalidate(self) -> None:
+        self._tasks = None
+        self._expires_at = 0.0
+        self._version += 1
+
+    async def _load(self, version: int) -> list[dict]:
+        tasks = await self._loader()
+        # если во время загрузки каталог сбросили — результат уже устарел,
+        # отдаём его текущим ожидающим, но в кэш не кладём
+        if version == self._version:
+            self._tasks = tasks
+            self._expires_at = time.monotonic() + self._ttl
+            self._version += 1
+        return tasks
+
+    async def get(self) -> list[dict]:
+        if self.is_fresh():
+            return self._tasks
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load(self._version))
+            self._inflight.add_done_callback(self._clear_inflight)
+
+        # shield: отмена одного ожидающего не должна рвать общий запрос
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, fut: asyncio.Future) -> None:
+        if self._inflight is fut:
+            self._inflight = None
+        # забираем исключение, чтобы asyncio не ругался на "never retrieved"
+        if not fut.cancelled():
+            fut.exception()
+
+    async def get_rendered(self, render: Callable[[list[dict]], T]) -> T:
+        tasks = await self.get()
+        if self._rendered is None or self._rendered_version != self._version:
+            self._rendered = render(tasks)
+            self._rendered_version = self._version
+        return self._rendered
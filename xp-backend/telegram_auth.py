@@ -0,0 +1,114 @@
+"""
+Проверка подписи Telegram WebApp (initData) — та же схема, что в lib/verifyTelegram.ts.
+
+secret = HMAC_SHA256(key="WebAppData", msg=bot_token) считается один раз
+при создании верификатора. Недавно проверенные initData лежат
+в ограниченном LRU, чтобы горячие клиенты не парсились заново.
+
+initData старше max_age секунд (по auth_date) не принимается — подпись
+бессрочна, а сервис использует initData как credential пользователя.
+"""
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+
+
+def derive_secret_key(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def _data_check_string(pairs: list[tuple[str, str]]) -> str:
+    return "\n".join(sorted(f"{k}={v}" for k, v in pairs if k != "hash"))
+
+
+def sign_init_data(fields: dict[str, str], bot_token: str) -> str:
+    """
+    Собирает подписанный initData (для локальных тестов и бенчмарков).
+    """
+    pairs = [(k, str(v)) for k, v in fields.items()]
+    digest = hmac.new(
+        derive_secret_key(bot_token),
+        _data_check_string(pairs).encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return urlencode(pairs + [("hash", digest)])
+
+
+class InitDataVerifier:
+    def __init__(self, bot_token: str, cache_size: int = 10_000, max_age: float = 24 * 3600):
+        self._secret = derive_secret_key(bot_token)
+        self._cache_size = cache_size
+        # 0 — без проверки возраста
+        self._max_age = max_age
+        # initData -> распарсенные поля; ключ — вся строка целиком,
+        # иначе можно было бы подсунуть чужой hash с другими полями
+        self._cache: OrderedDict[str, dict[str, str]] = OrderedDict()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def verify(self, init_data: str) -> dict[str, str] | None:
+        """
+        Возвращает поля initData, если подпись верна и он не просрочен, иначе None.
+        """
+        cached = self._cache.get(init_data)
+        if cached is not None:
+            self._cache.move_to_end(init_data)
+            self.cache_hits += 1
+            return cached if self._fresh(cached) else None
+
+        self.cache_misses += 1
+
+        try:
+            pairs = parse_qsl(init_data, keep_blank_values=True, strict_parsing=True)
+        except ValueError:
+            return None
+
+        fields = dict(pairs)
+        received_hash = fields.get("hash")
+        if not received_hash:
+            return None
+
+        calculated_hash = hmac.new(
+            self._secret,
+            _data_check_string(pairs).encode(),
+            hashlib.sha256,
+        ).hexdigest()
+
+        if not hmac.compare_digest(calculated_hash, received_hash):
+            return None
+
+        if not self._fresh(fields):
+            return None
+
+        self._cache[init_data] = fields
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return fields
+
+    def _fresh(self, fields: dict[str, str]) -> bool:
+        if self._max_age <= 0:
+            return True
+        try:
+            auth_date = int(fields.get("auth_date") or "")
+        except ValueError:
+            return False
+        return time.time() - auth_date <= self._max_age
+
+
+def init_data_user_id(fields: dict[str, str]) -> str | None:
+    """
+    Достаёт id пользователя из поля user (JSON) проверенного initData.
+    """
+    raw_user = fields.get("user")
+    if not raw_user:
+        return None
+    try:
+        user_id = json.loads(raw_user).get("id")
+    except (ValueError, AttributeError):
+        return None
+    return str(user_id) if user_id is not None else None
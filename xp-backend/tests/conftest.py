@@ -0,0 +1,5 @@
+import os
+import sys
+
+# модули xp-backend лежат плоско, без пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,165 @@
+import importlib
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from completion_policy import CompletionPolicy, TaskPolicy  # noqa: E402
+from dedup import DedupIndex  # noqa: E402
+from event_log import EventLog  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def main_module(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("xp")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+        mp.setenv("XP_STORE", "memory")
+        mp.setenv("XP_SHARED_STATE", "0")
+        mp.setenv("XP_EVENT_LOG_DIR", str(tmp / "events"))
+        mp.setenv("XP_FLUSH_MAX_PENDING", "0")
+        yield importlib.import_module("main")
+
+
+@pytest.fixture
+def main(main_module, tmp_path, monkeypatch):
+    # своё состояние на каждый тест
+    event_log = EventLog(str(tmp_path / "events"))
+    event_log.open()
+    monkeypatch.setattr(main_module, "event_log", event_log)
+    monkeypatch.setattr(main_module, "claim_dedup", DedupIndex())
+    monkeypatch.setattr(
+        main_module,
+        "completion_policy",
+        CompletionPolicy({"once": TaskPolicy("single", 1)}),
+    )
+    yield main_module
+    event_log.close()
+
+
+def claim(main, items, batch_id=None):
+    counts = main._batch_counts()
+    return main._claim_batch(items, batch_id, counts), counts
+
+
+def item(user_id, task_id="task", amount=10, key=None):
+    raw = {"userId": user_id, "taskId": task_id, "amount": amount}
+    if key is not None:
+        raw["idempotencyKey"] = key
+    return raw
+
+
+def test_ok_results_carry_running_balance(main):
+    results, counts = claim(main, [item("b-ok", "t1", 10), item("b-ok", "t2", 5)])
+    assert [r[:2] for r in results] == [["ok", 10], ["ok", 15]]
+    assert results[1][2] == main.level_for(15)
+    assert counts["applied"] == 2
+    assert main.event_log.balances["b-ok"] == 15
+
+
+def test_invalid_items(main):
+    results, counts = claim(
+        main,
+        [
+            "not an object",
+            item(""),
+            item("b-inv", task_id=123),
+            item("b-inv", amount="10"),
+            item("b-inv", amount=True),
+            item("b-inv", amount=main.XP_MAX_AMOUNT + 1),
+            item("b-inv", key=5),
+        ],
+    )
+    assert results == [
+        ["invalid", "INVALID_ITEM"],
+        ["invalid", "INVALID_USER_ID"],
+        ["invalid", "INVALID_TASK_ID"],
+        ["invalid", "INVALID_AMOUNT"],
+        ["invalid", "INVALID_AMOUNT"],
+        ["invalid", "INVALID_AMOUNT"],
+        ["invalid", "INVALID_ITEM"],
+    ]
+    assert counts["invalid"] == 7
+    assert counts["applied"] == 0
+
+
+def test_missing_amount_defaults_to_100(main):
+    results, _ = claim(main, [{"userId": "b-default", "taskId": "t"}])
+    assert results[0][:2] == ["ok", 100]
+
+
+def test_repeat_in_same_batch_is_dup(main):
+    results, counts = claim(main, [item("b-rep", "t1"), item("b-rep", "t1")])
+    assert results[0][:2] == ["ok", 10]
+    assert results[1] == ["dup", *results[0][1:]]
+    assert counts == {"applied": 1, "dup": 1, "limit": 0, "busy": 0, "invalid": 0}
+
+
+def test_repeat_batch_replays_by_batch_id(main):
+    first, _ = claim(main, [item("b-id", "t1")], batch_id="B1")
+    again, counts = claim(main, [item("b-id", "t1")], batch_id="B1")
+    assert again == [["dup", *first[0][1:]]]
+    assert counts["applied"] == 0
+    assert main.event_log.balances["b-id"] == 10
+
+
+def test_idempotency_key_replays_across_batches(main):
+    first, _ = claim(main, [item("b-key", key="k1")])
+    again, _ = claim(main, [item("b-key", amount=99, key="k1")])
+    assert again == [["dup", *first[0][1:]]]
+
+
+def test_batch_keys_do_not_collide_with_claim_keys(main):
+    # /xp/claim держит тот же ключ — пачка этого не видит
+    main.claim_dedup.put("claim:b-ns:k1", {"totalXp": 1})
+    results, _ = claim(main, [item("b-ns", key="k1")])
+    assert results[0][0] == "ok"
+
+
+def test_busy_while_same_key_in_flight(main):
+    assert main.claim_dedup.reserve("batch:b-busy:k1") == (True, None)
+    results, counts = claim(main, [item("b-busy", key="k1")])
+    assert results == [["busy"]]
+    assert counts["busy"] == 1
+
+
+def test_limit_reached(main):
+    results, counts = claim(
+        main, [item("b-lim", "once", key="a"), item("b-lim", "once", key="b")]
+    )
+    assert results[0][0] == "ok"
+    assert results[1] == ["limit", 1]
+    assert counts["limit"] == 1
+    # отказ по лимиту не держит ключ: повтор снова упрётся в лимит, а не в busy
+    again, _ = claim(main, [item("b-lim", "once", key="b")])
+    assert again == [["limit", 1]]
+
+
+def test_log_failure_releases_keys_and_counters(main):
+    def fail(records, ts=None):
+        raise OSError("disk full")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main.event_log, "append_many", fail)
+        with pytest.raises(OSError):
+            claim(main, [item("b-fail", "once", key="k1")])
+
+    # ни ключ, ни счётчик выполнений не остались занятыми
+    assert main.claim_dedup.reserve("batch:b-fail:k1") == (True, None)
+    main.claim_dedup.release("batch:b-fail:k1")
+    results, _ = claim(main, [item("b-fail", "once", key="k1")])
+    assert results[0][0] == "ok"
+
+
+def test_store_failure_still_credits_from_log(main):
+    def fail(deltas, seq=None):
+        raise RuntimeError("store down")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main.xp_writes, "add_many", fail)
+        results, counts = claim(main, [item("b-store", amount=7, key="k1")])
+    assert results[0][:2] == ["ok", 7]
+    assert counts["applied"] == 1
+    # начисление уже в журнале — повтор получает исходный ответ
+    again, _ = claim(main, [item("b-store", amount=7, key="k1")])
+    assert again == [["dup", *results[0][1:]]]
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from dedup import DedupIndex
+from shared_state import SharedDedupIndex, SharedState
+
+
+@pytest.fixture(params=["memory", "shared"])
+def make_index(request, tmp_path):
+    states = []
+
+    def make(**kwargs):
+        if request.param == "memory":
+            return DedupIndex(**kwargs)
+        state = SharedState(str(tmp_path / "shared.db"))
+        states.append(state)
+        return SharedDedupIndex(state, **kwargs)
+
+    yield make
+    for state in states:
+        state.close()
+
+
+def test_reserve_then_put_replays_response(make_index):
+    index = make_index()
+    assert index.reserve("k") == (True, None)
+    # пока ответа нет, повтор ждёт
+    assert index.reserve("k") == (False, None)
+    assert index.get("k") is None
+
+    index.put("k", {"totalXp": 10})
+    assert index.reserve("k") == (False, {"totalXp": 10})
+    assert index.get("k") == {"totalXp": 10}
+
+
+def test_release_frees_pending_key(make_index):
+    index = make_index()
+    assert index.reserve("k") == (True, None)
+    index.release("k")
+    assert index.reserve("k") == (True, None)
+
+
+def test_release_keeps_stored_response(make_index):
+    index = make_index()
+    index.reserve("k")
+    index.put("k", {"totalXp": 1})
+    index.release("k")
+    assert index.reserve("k") == (False, {"totalXp": 1})
+
+
+def test_keys_are_independent(make_index):
+    index = make_index()
+    assert index.reserve("claim:u1:a") == (True, None)
+    assert index.reserve("batch:u1:a") == (True, None)
+
+
+def test_pending_key_expires(make_index):
+    index = make_index(pending_ttl=0.05)
+    assert index.reserve("k") == (True, None)
+    assert index.reserve("k") == (False, None)
+    time.sleep(0.1)
+    # воркер не дошёл ни до put, ни до release — ключ снова свободен
+    assert index.reserve("k") == (True, None)
+
+
+def test_response_expires(make_index):
+    index = make_index(ttl=0.05)
+    index.reserve("k")
+    index.put("k", {"totalXp": 1})
+    time.sleep(0.1)
+    assert index.get("k") is None
+    assert index.reserve("k") == (True, None)
+
+
+def test_shared_reserve_is_seen_by_other_process(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first = SharedDedupIndex(SharedState(path))
+    second = SharedDedupIndex(SharedState(path))
+
+    assert first.reserve("k") == (True, None)
+    assert second.reserve("k") == (False, None)
+    first.put("k", {"totalXp": 3})
+    assert second.reserve("k") == (False, {"totalXp": 3})
+
+
+def test_memory_index_evicts_over_max_size():
+    index = DedupIndex(max_size=2)
+    for key in ("a", "b", "c"):
+        index.reserve(key)
+        index.put(key, key)
+    assert len(index) == 2
+    assert index.get("a") is None
+    assert index.get("c") == "c"
@@ -0,0 +1,165 @@
+import os
+
+from event_log import EventLog
+
+
+def open_log(directory, **kwargs) -> EventLog:
+    event_log = EventLog(str(directory), **kwargs)
+    event_log.open()
+    return event_log
+
+
+def test_replay_restores_balances_and_seq(tmp_path):
+    event_log = open_log(tmp_path)
+    event_log.append("u1", "t1", 10)
+    event_log.append_many([("u2", "t1", 5), ("u1", "t2", 7)])
+    event_log.close()
+
+    reopened = open_log(tmp_path)
+    assert reopened.last_seq == 3
+    assert reopened.balances == {"u1": 17, "u2": 5}
+    assert [e["seq"] for e in reopened.iter_events()] == [1, 2, 3]
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    event_log = open_log(tmp_path)
+    event_log.append("u1", "t1", 10)
+    event_log.append("u1", "t2", 20)
+    event_log.close()
+
+    (_, path), = EventLog(str(tmp_path))._segments()
+    good_size = os.path.getsize(path)
+    # падение посреди write: от последней записи осталась половина
+    with open(path, "r+b") as f:
+        f.truncate(good_size - 5)
+
+    reopened = open_log(tmp_path)
+    assert reopened.last_seq == 1
+    assert reopened.balances == {"u1": 10}
+
+    # хвост отрезан, новая запись встаёт сразу за целой
+    assert reopened.append("u1", "t3", 1) == 2
+    reopened.close()
+    events = list(open_log(tmp_path).iter_events())
+    assert [(e["seq"], e["taskId"]) for e in events] == [(1, "t1"), (2, "t3")]
+
+
+def test_corrupted_record_stops_replay(tmp_path):
+    event_log = open_log(tmp_path)
+    event_log.append("u1", "t1", 10)
+    event_log.append("u1", "t2", 20)
+    event_log.close()
+
+    (_, path), = EventLog(str(tmp_path))._segments()
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+
+    reopened = open_log(tmp_path)
+    assert reopened.last_seq == 1
+    assert reopened.balances == {"u1": 10}
+
+
+def test_replay_after_snapshot_applies_only_tail(tmp_path):
+    event_log = open_log(tmp_path)
+    event_log.append("u1", "t1", 10)
+    seq = event_log.append("u2", "t1", 5)
+    event_log.write_snapshot(dict(event_log.balances), seq, extra={"k": 1})
+    event_log.append("u1", "t2", 3)
+    event_log.close()
+
+    reopened = open_log(tmp_path)
+    assert reopened.snapshot_seq == 2
+    assert reopened.snapshot_extra == {"k": 1}
+    assert reopened.last_seq == 3
+    assert reopened.balances == {"u1": 13, "u2": 5}
+
+
+def test_snapshot_balances_are_not_recomputed_from_log(tmp_path):
+    # балансы до снапшота берутся из него, а не из сегментов
+    event_log = open_log(tmp_path)
+    seq = event_log.append("u1", "t1", 10)
+    event_log.write_snapshot({"u1": 100}, seq)
+    event_log.append("u1", "t2", 1)
+    event_log.close()
+
+    assert open_log(tmp_path).balances == {"u1": 101}
+
+
+def test_old_snapshots_are_removed(tmp_path):
+    event_log = open_log(tmp_path)
+    event_log.write_snapshot(dict(event_log.balances), event_log.append("u1", "t1", 1))
+    event_log.write_snapshot(dict(event_log.balances), event_log.append("u1", "t2", 1))
+    assert [seq for seq, _ in event_log._snapshots()] == [2]
+
+
+def test_rotation_across_segments(tmp_path):
+    event_log = open_log(tmp_path, segment_bytes=100)
+    for i in range(10):
+        event_log.append(f"u{i % 3}", f"t{i}", 1)
+    event_log.append_many([("u0", "batch", 1)] * 5)
+    event_log.close()
+
+    segments = EventLog(str(tmp_path))._segments()
+    assert len(segments) > 1
+    # имя сегмента — seq его первой записи
+    for first_seq, path in segments:
+        first = next(EventLog._iter_file(path))[1]
+        assert first["seq"] == first_seq
+
+    reopened = open_log(tmp_path, segment_bytes=100)
+    assert reopened.last_seq == 15
+    assert sum(reopened.balances.values()) == 15
+    assert [e["seq"] for e in reopened.iter_events(since_seq=7)] == list(range(8, 16))
+
+
+def test_replay_after_snapshot_skips_old_segments(tmp_path):
+    event_log = open_log(tmp_path, segment_bytes=100)
+    for i in range(10):
+        event_log.append("u1", f"t{i}", 1)
+    event_log.write_snapshot(dict(event_log.balances), event_log.last_seq)
+    event_log.append("u1", "tail", 5)
+    event_log.close()
+
+    # сегменты целиком до снапшота не читаются: их порча не мешает старту
+    segments = EventLog(str(tmp_path))._segments()
+    with open(segments[0][1], "r+b") as f:
+        f.truncate(3)
+
+    reopened = open_log(tmp_path, segment_bytes=100)
+    assert reopened.last_seq == 11
+    assert reopened.balances == {"u1": 15}
+
+
+def test_user_history_pages_and_scan_limit(tmp_path):
+    event_log = open_log(tmp_path)
+    for i in range(6):
+        event_log.append("u1" if i % 2 == 0 else "u2", f"t{i}", 1)
+
+    events, next_since = event_log.user_history("u1", 0, limit=2, max_scan=100)
+    assert [e["seq"] for e in events] == [1, 3]
+    assert next_since == 3
+
+    events, next_since = event_log.user_history("u1", next_since, limit=2, max_scan=100)
+    assert [e["seq"] for e in events] == [5]
+    assert next_since is None
+
+    # предел просмотра: продолжать с первой непросмотренной записи
+    events, next_since = event_log.user_history("u1", 0, limit=10, max_scan=2)
+    assert [e["seq"] for e in events] == [1]
+    assert next_since == 2
+
+
+def test_shared_logs_keep_seq_contiguous(tmp_path):
+    first = open_log(tmp_path, shared=True, segment_bytes=100)
+    second = open_log(tmp_path, shared=True, segment_bytes=100)
+
+    assert first.append("u1", "t1", 1) == 1
+    assert second.append("u2", "t1", 2) == 2
+    assert first.append_many([("u1", "t2", 3), ("u1", "t3", 4)]) == 4
+    # чужие записи: дочитанная перед своей append и дописанные после
+    assert [e["seq"] for e in second.poll()] == [1, 3, 4]
+    assert second.poll() == []
+    assert second.balances == first.balances == {"u1": 8, "u2": 2}
+    first.close()
+    second.close()
@@ -0,0 +1,74 @@
+import asyncio
+import importlib
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+ADMIN = 1
+
+
+@pytest.fixture(scope="module")
+def bot_module(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("bot")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+        mp.setenv("FSM_DB_PATH", str(tmp / "bot-fsm.db"))
+        yield importlib.import_module("bot")
+
+
+@pytest.fixture
+def bot(bot_module, monkeypatch):
+    pages = {
+        None: ([{"id": "p1"}, {"id": "p2"}], "c1"),
+        "c1": ([{"id": "p3"}], None),
+    }
+    fetched = []
+
+    async def fetch_pending_page(cursor, limit):
+        fetched.append(cursor)
+        return pages[cursor]
+
+    monkeypatch.setattr(bot_module, "fetch_pending_page", fetch_pending_page)
+    monkeypatch.setattr(bot_module, "last_pending_ids", {ADMIN: ["a", "b", "c", "d"]})
+    bot_module.fetched = fetched
+    return bot_module
+
+
+def resolve(bot, *tokens, admin_id=ADMIN):
+    return asyncio.run(bot.resolve_completion_ids(list(tokens), admin_id))
+
+
+def test_numbers_and_ranges_from_last_pending(bot):
+    assert resolve(bot, "1", "3-4") == (["a", "c", "d"], [])
+
+
+def test_commas_hashes_and_duplicates(bot):
+    assert resolve(bot, "#2,1-2", "2") == (["b", "a"], [])
+
+
+def test_out_of_range_tokens_are_reported(bot):
+    assert resolve(bot, "0", "5", "3-2", "2") == (["b"], ["0", "5", "3-2"])
+
+
+def test_raw_ids_pass_through(bot):
+    assert resolve(bot, "cmp_123", "abc-def") == (["cmp_123", "abc-def"], [])
+
+
+def test_bare_number_without_pending_list_is_an_id(bot):
+    assert resolve(bot, "42", admin_id=2) == (["42"], [])
+    # диапазон без открытого /pending разрешить нечем
+    assert resolve(bot, "1-2", admin_id=2) == ([], ["1-2"])
+
+
+def test_all_fetches_every_pending_page_once(bot):
+    assert resolve(bot, "all", "ALL", "p9", "2") == (["p1", "p2", "p3", "p9", "b"], [])
+    assert bot.fetched == [None, "c1"]
+
+
+def test_all_with_empty_queue(bot, monkeypatch):
+    async def empty(cursor, limit):
+        return [], None
+
+    monkeypatch.setattr(bot, "fetch_pending_page", empty)
+    assert resolve(bot, "all") == ([], [])
@@ -0,0 +1,196 @@
+"""
+Ограниченный пул воркеров для обработки апдейтов бота.
+
+У каждого чата своя очередь апдейтов, а воркеры общие: воркер берёт из
+очереди готовых чатов следующий, выполняет один его апдейт и, если у чата
+есть ещё, ставит его в конец очереди готовых. Один чат в любой момент
+обрабатывается не больше чем одним воркером — порядок внутри чата
+сохраняется, а медленный хендлер (например, /approve all) держит только
+свой чат и один воркер, не задевая остальных.
+
+Ограничения:
+- chat_queue_size — апдейтов в очереди одного чата; сверх этого апдейт
+  отбрасывается сразу, без ожидания: флуд одного чата не тормозит polling;
+- queue_size — апдейтов во всех очередях вместе; когда их столько,
+  submit() ждёт (backpressure на polling-цикл / webhook-запрос) не дольше
+  put_timeout, потом апдейт отбрасывается.
+Отброшенные апдейты считаются в dropped и пишутся в лог; take_drop_notice()
+говорит, стоит ли предупредить чат (один раз, пока его очередь не разберётся).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Hashable
+
+log = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[object]]
+
+
+class UpdateWorkerPool:
+    def __init__(
+        self,
+        workers: int = 8,
+        queue_size: int = 1000,
+        chat_queue_size: int = 20,
+        put_timeout: float = 5.0,
+    ):
+        self._workers = workers
+        self._queue_size = queue_size
+        self._chat_queue_size = chat_queue_size
+        self._put_timeout = put_timeout
+
+        # чат -> его апдейты; чат здесь есть, пока он в _ready или у воркера
+        self._chats: dict[Hashable, deque] = {}
+        self._ready: asyncio.Queue | None = None
+        self._space: asyncio.Condition | None = None
+        self._idle: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        # принятые и ещё не доделанные апдейты (в очередях + в работе)
+        self._queued = 0
+        # чаты, которым уже сказали про отброшенный апдейт
+        self._notified: set[Hashable] = set()
+
+        # гейджи / счётчики
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_wait_ms = 0.0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.total_latency_ms = 0.0
+
+    # -----------------------------------------------------------------
+    # Жизненный цикл
+    # -----------------------------------------------------------------
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._space = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        """
+        Дорабатывает всё, что уже в очередях, и останавливает воркеров.
+        """
+        if not self._tasks:
+            return
+        await self._idle.wait()
+        for _ in self._tasks:
+            self._ready.put_nowait(None)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # -----------------------------------------------------------------
+    # Работа
+    # -----------------------------------------------------------------
+    async def submit(self, key: Hashable, job: Job) -> bool:
+        """
+        Ставит задачу в очередь чата. False — апдейт отброшен
+        (очередь чата полна или пул не освободился за put_timeout).
+        """
+        if self._chat_full(key):
+            return self._drop(key, "chat queue full")
+
+        if self._queued >= self._queue_size:
+            try:
+                await asyncio.wait_for(self._wait_space(), self._put_timeout)
+            except asyncio.TimeoutError:
+                return self._drop(key, "update pool full")
+            # пока ждали, очередь этого чата могла набраться
+            if self._chat_full(key):
+                return self._drop(key, "chat queue full")
+
+        self._queued += 1
+        self._idle.clear()
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = deque()
+            self._ready.put_nowait(key)
+        chat.append((time.perf_counter(), job))
+        return True
+
+    def _chat_full(self, key: Hashable) -> bool:
+        chat = self._chats.get(key)
+        return chat is not None and len(chat) >= self._chat_queue_size
+
+    async def _wait_space(self) -> None:
+        async with self._space:
+            await self._space.wait_for(lambda: self._queued < self._queue_size)
+
+    def _drop(self, key: Hashable, reason: str) -> bool:
+        self.dropped += 1
+        log.warning("Update dropped", extra={"key": key, "reason": reason})
+        return False
+
+    def take_drop_notice(self, key: Hashable) -> bool:
+        """
+        True при первом отброшенном апдейте чата с тех пор, как его
+        очередь в последний раз разобралась, — чтобы не отвечать на флуд флудом.
+        """
+        if key in self._notified:
+            return False
+        self._notified.add(key)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            if key is None:
+                return
+
+            chat = self._chats[key]
+            enqueued_at, job = chat.popleft()
+            self.in_flight += 1
+            started = time.perf_counter()
+            self.last_wait_ms = (started - enqueued_at) * 1000
+            try:
+                await job()
+            except Exception:
+                self.failed += 1
+                log.exception("Update handler error")
+            finally:
+                self.in_flight -= 1
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.processed += 1
+                self.last_latency_ms = elapsed_ms
+                self.max_latency_ms = max(self.max_latency_ms, elapsed_ms)
+                self.total_latency_ms += elapsed_ms
+
+                if chat:
+                    # в конец очереди готовых: остальные чаты не ждут, пока этот разберётся
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+                    self._notified.discard(key)
+
+                self._queued -= 1
+                if not self._queued:
+                    self._idle.set()
+                async with self._space:
+                    self._space.notify()
+
+    def queue_depth(self) -> int:
+        return self._queued - self.in_flight
+
+    def stats(self) -> dict:
+        return {
+            "workers": self._workers,
+            "queueDepth": self.queue_depth(),
+            "activeChats": len(self._chats),
+            "inFlight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "lastWaitMs": round(self.last_wait_ms, 3),
+            "lastLatencyMs": round(self.last_latency_ms, 3),
+            "maxLatencyMs": round(self.max_latency_ms, 3),
+            "avgLatencyMs": (
+                round(self.total_latency_ms / self.processed, 3) if self.processed else 0.0
+            ),
+        }
@@ -0,0 +1,310 @@
+"""
+Хранилище XP-балансов.
+
+XpStore — общий интерфейс, под ним два движка:
+- MemoryXpStore — словарь в памяти (для тестов и локальных экспериментов);
+- SqliteXpStore — SQLite в режиме WAL с пулом соединений; начисление
+  делается одним UPSERT ... RETURNING, поэтому read-modify-write атомарен
+  и XP не теряется при перезапуске.
+
+applied_seq — отметка журнала начислений (event_log.py): все события
+с seq не больше неё уже лежат в балансах. increment_many(deltas, seq)
+сдвигает её в той же транзакции, что и сами балансы, так что после
+падения main.py доигрывает в хранилище ровно хвост журнала после отметки.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+
+class XpStore(ABC):
+    # переживают ли балансы перезапуск процесса сами по себе
+    durable = False
+
+    @abstractmethod
+    def get(self, user_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def set(self, user_id: str, xp: int) -> None:
+        ...
+
+    @abstractmethod
+    def increment(self, user_id: str, delta: int) -> int:
+        """
+        Атомарно прибавляет delta и возвращает новый баланс.
+        """
+
+    @abstractmethod
+    def all_balances(self) -> Iterator[tuple[str, int]]:
+        """
+        Все пары (user_id, total_xp) — для прогрева лидерборда при старте.
+        """
+
+    def increment_many(self, deltas: Dict[str, int], seq: int | None = None) -> Dict[str, int]:
+        """
+        Начисляет пачку {user_id: delta} и возвращает новые балансы.
+        Движки, умеющие транзакции, применяют пачку целиком или никак.
+        seq — до какого события журнала теперь всё применено (см. applied_seq).
+        """
+        return {user_id: self.increment(user_id, delta) for user_id, delta in deltas.items()}
+
+    def applied_seq(self) -> int | None:
+        """
+        Отметка журнала или None, если хранилище её не ведёт.
+        """
+        return None
+
+    def set_applied_seq(self, seq: int | None) -> None:
+        """
+        Ставит отметку (None — стирает: хранилище пишут в обход неё).
+        """
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------
+# In-memory
+# ---------------------------------------------------------------------
+class MemoryXpStore(XpStore):
+    def __init__(self):
+        self._db: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> int:
+        return self._db.get(user_id, 0)
+
+    def set(self, user_id: str, xp: int) -> None:
+        self._db[user_id] = xp
+
+    def increment(self, user_id: str, delta: int) -> int:
+        with self._lock:
+            total = self._db.get(user_id, 0) + delta
+            self._db[user_id] = total
+            return total
+
+    def all_balances(self) -> Iterator[tuple[str, int]]:
+        return iter(list(self._db.items()))
+
+    def increment_many(self, deltas: Dict[str, int], seq: int | None = None) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for user_id, delta in deltas.items():
+                totals[user_id] = self._db.get(user_id, 0) + delta
+                self._db[user_id] = totals[user_id]
+        return totals
+
+
+# ---------------------------------------------------------------------
+# SQLite (WAL)
+# ---------------------------------------------------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS xp_balances (
+    user_id  TEXT PRIMARY KEY,
+    total_xp INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID
+"""
+
+_META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS xp_meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER
+) WITHOUT ROWID
+"""
+
+_SET_APPLIED_SQL = """
+INSERT INTO xp_meta (key, value) VALUES ('applied_seq', ?)
+ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)
+"""
+
+_INCREMENT_SQL = """
+INSERT INTO xp_balances (user_id, total_xp) VALUES (?, ?)
+ON CONFLICT (user_id) DO UPDATE SET total_xp = total_xp + excluded.total_xp
+RETURNING total_xp
+"""
+
+
+class SqliteXpStore(XpStore):
+    durable = True
+
+    def __init__(self, path: str, pool_size: int = 4, busy_timeout_ms: int = 5000):
+        self.path = path
+        self._busy_timeout_ms = busy_timeout_ms
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._all: list[sqlite3.Connection] = []
+
+        for _ in range(pool_size):
+            conn = self._connect()
+            self._all.append(conn)
+            self._pool.put(conn)
+
+        with self._connection() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute(_META_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None — autocommit: каждый оператор сам себе транзакция
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self._busy_timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def get(self, user_id: str) -> int:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT total_xp FROM xp_balances WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set(self, user_id: str, xp: int) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO xp_balances (user_id, total_xp) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET total_xp = excluded.total_xp",
+                (user_id, xp),
+            )
+
+    def increment(self, user_id: str, delta: int) -> int:
+        with self._connection() as conn:
+            # fetchall, а не fetchone: оператор должен дойти до конца,
+            # иначе неявная транзакция останется открытой
+            ((total,),) = conn.execute(_INCREMENT_SQL, (user_id, delta)).fetchall()
+        return total
+
+    def all_balances(self) -> Iterator[tuple[str, int]]:
+        with self._connection() as conn:
+            rows = conn.execute("SELECT user_id, total_xp FROM xp_balances").fetchall()
+        return iter(rows)
+
+    def increment_many(self, deltas: Dict[str, int], seq: int | None = None) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id, delta in deltas.items():
+                    ((totals[user_id],),) = conn.execute(
+                        _INCREMENT_SQL, (user_id, delta)
+                    ).fetchall()
+                if seq is not None:
+                    conn.execute(_SET_APPLIED_SQL, (seq,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return totals
+
+    def applied_seq(self) -> int | None:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM xp_meta WHERE key = 'applied_seq'"
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_applied_seq(self, seq: int | None) -> None:
+        with self._connection() as conn:
+            if seq is None:
+                conn.execute("DELETE FROM xp_meta WHERE key = 'applied_seq'")
+            else:
+                conn.execute(
+                    "INSERT INTO xp_meta (key, value) VALUES ('applied_seq', ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                    (seq,),
+                )
+
+    def close(self) -> None:
+        for conn in self._all:
+            conn.close()
+        self._all.clear()
+
+
+# ---------------------------------------------------------------------
+# Обёртка с замером времени операций
+# ---------------------------------------------------------------------
+class InstrumentedXpStore(XpStore):
+    """
+    Проксирует вызовы в настоящий движок и отдаёт длительность каждой
+    операции в observe(op, seconds) — например, в гистограмму метрик.
+    """
+
+    def __init__(self, inner: XpStore, observe: Callable[[str, float], None]):
+        self.inner = inner
+        self.durable = inner.durable
+        self._observe = observe
+
+    def get(self, user_id: str) -> int:
+        started = time.perf_counter()
+        try:
+            return self.inner.get(user_id)
+        finally:
+            self._observe("get", time.perf_counter() - started)
+
+    def set(self, user_id: str, xp: int) -> None:
+        started = time.perf_counter()
+        try:
+            self.inner.set(user_id, xp)
+        finally:
+            self._observe("set", time.perf_counter() - started)
+
+    def increment(self, user_id: str, delta: int) -> int:
+        started = time.perf_counter()
+        try:
+            return self.inner.increment(user_id, delta)
+        finally:
+            self._observe("increment", time.perf_counter() - started)
+
+    def increment_many(self, deltas: Dict[str, int], seq: int | None = None) -> Dict[str, int]:
+        started = time.perf_counter()
+        try:
+            return self.inner.increment_many(deltas, seq)
+        finally:
+            self._observe("increment_many", time.perf_counter() - started)
+
+    def applied_seq(self) -> int | None:
+        return self.inner.applied_seq()
+
+    def set_applied_seq(self, seq: int | None) -> None:
+        self.inner.set_applied_seq(seq)
+
+    def all_balances(self) -> Iterator[tuple[str, int]]:
+        return self.inner.all_balances()
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def open_store(kind: str | None = None, path: str | None = None) -> XpStore:
+    """
+    Создаёт движок по настройкам окружения:
+    XP_STORE=sqlite|memory, XP_DB_PATH=путь к файлу SQLite.
+    """
+    kind = (kind or os.getenv("XP_STORE", "sqlite")).lower()
+
+    if kind == "memory":
+        return MemoryXpStore()
+    if kind == "sqlite":
+        return SqliteXpStore(
+            path or os.getenv("XP_DB_PATH", "xp.db"),
+            pool_size=int(os.getenv("XP_DB_POOL_SIZE", "4")),
+        )
+
+    raise ValueError(f"Неизвестный XP_STORE: {kind!r}")